@@ -1,61 +1,144 @@
 """Firebase configuration and initialization."""
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Optional, Dict, Any
 
 import firebase_admin
 from firebase_admin import credentials, firestore
-from firebase_admin.firestore import SERVER_TIMESTAMP
-from pydantic import BaseSettings, Field
+from pydantic import Field, field_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from app.firebase.constants import SERVER_TIMESTAMP
+from app.utils.config import settings
 
 # Re-export SERVER_TIMESTAMP for easier access
-__all__ = ["get_firestore_client", "SERVER_TIMESTAMP", "FirebaseConfig"]
+__all__ = [
+    "get_firestore_client",
+    "get_firestore_executor",
+    "shutdown_firestore_executor",
+    "warm_firestore_client",
+    "SERVER_TIMESTAMP",
+    "FirebaseConfig",
+]
+
+logger = logging.getLogger(__name__)
+
+# Document used to open the Firestore connection at startup; it never exists
+WARMUP_COLLECTION = "_warmup"
+WARMUP_DOCUMENT = "ping"
 
 class FirebaseConfig(BaseSettings):
     """Firebase configuration settings."""
-    project_id: str = Field(..., env="FIREBASE_PROJECT_ID")
-    private_key_id: str = Field(..., env="FIREBASE_PRIVATE_KEY_ID")
-    private_key: str = Field(..., env="FIREBASE_PRIVATE_KEY")
-    client_email: str = Field(..., env="FIREBASE_CLIENT_EMAIL")
-    client_id: str = Field(..., env="FIREBASE_CLIENT_ID")
-    auth_uri: str = Field("https://accounts.google.com/o/oauth2/auth", env="FIREBASE_AUTH_URI")
-    token_uri: str = Field("https://oauth2.googleapis.com/token", env="FIREBASE_TOKEN_URI")
+    project_id: str = Field(..., validation_alias="FIREBASE_PROJECT_ID")
+    private_key_id: str = Field(..., validation_alias="FIREBASE_PRIVATE_KEY_ID")
+    private_key: str = Field(..., validation_alias="FIREBASE_PRIVATE_KEY")
+    client_email: str = Field(..., validation_alias="FIREBASE_CLIENT_EMAIL")
+    client_id: str = Field(..., validation_alias="FIREBASE_CLIENT_ID")
+    auth_uri: str = Field("https://accounts.google.com/o/oauth2/auth", validation_alias="FIREBASE_AUTH_URI")
+    token_uri: str = Field("https://oauth2.googleapis.com/token", validation_alias="FIREBASE_TOKEN_URI")
     auth_provider_cert_url: str = Field(
         "https://www.googleapis.com/oauth2/v1/certs",
-        env="FIREBASE_AUTH_PROVIDER_CERT_URL"
+        validation_alias="FIREBASE_AUTH_PROVIDER_CERT_URL"
     )
     client_cert_url: str = Field(
         f"https://www.googleapis.com/robot/v1/metadata/x509/your-service-account%40your-project.iam.gserviceaccount.com",
-        env="FIREBASE_CLIENT_CERT_URL"
+        validation_alias="FIREBASE_CLIENT_CERT_URL"
     )
 
-    class Config:
-        env_file = os.getenv("ENV_FILE", ".env")
-        env_file_encoding = "utf-8"
-        case_sensitive = True
+    model_config = SettingsConfigDict(
+        env_file=os.getenv("ENV_FILE", ".env"),
+        env_file_encoding="utf-8",
+        case_sensitive=True,
+        extra="ignore"
+    )
+
+    @field_validator("private_key")
+    @classmethod
+    def unescape_private_key(cls, value: str) -> str:
+        """Turn the escaped newlines used in .env files into real ones."""
+        return value.replace('\\n', '\n')
+
+@lru_cache(maxsize=1)
+def get_firebase_config() -> FirebaseConfig:
+    """Get the Firebase settings, read from the environment once per process."""
+    return FirebaseConfig()
 
+@lru_cache(maxsize=1)
 def get_firebase_credentials() -> credentials.Certificate:
-    """Initialize and return Firebase credentials."""
-    config = FirebaseConfig()
-    return {
+    """Initialize and return Firebase credentials.
+    
+    The certificate (and the private key it parses) is built once per process.
+    """
+    config = get_firebase_config()
+    return credentials.Certificate({
         "type": "service_account",
         "project_id": config.project_id,
         "private_key_id": config.private_key_id,
-        "private_key": config.private_key.replace('\\n', '\n'),
+        "private_key": config.private_key,
         "client_email": config.client_email,
         "client_id": config.client_id,
         "auth_uri": config.auth_uri,
         "token_uri": config.token_uri,
         "auth_provider_x509_cert_url": config.auth_provider_cert_url,
         "client_x509_cert_url": config.client_cert_url,
-    }
+    })
 
-# Initialize Firebase app
-firebase_app = firebase_admin.initialize_app(credentials.Certificate(get_firebase_credentials()))
+# Initialize Firebase app once, even if this module is imported more than once
+if not firebase_admin._apps:
+    firebase_app = firebase_admin.initialize_app(get_firebase_credentials())
+else:
+    firebase_app = firebase_admin.get_app()
 
+@lru_cache(maxsize=1)
 def get_firestore_client() -> firestore.Client:
-    """Get a Firestore client instance.
+    """Get the shared Firestore client instance.
+    
+    The client is created on first use and reused for the lifetime of the
+    process, so routes and services never pay for client construction twice.
     
     Returns:
         firestore.Client: Initialized Firestore client
     """
     return firestore.client()
+
+
+@lru_cache(maxsize=1)
+def get_firestore_executor() -> ThreadPoolExecutor:
+    """Get the thread pool that runs blocking Firestore SDK calls.
+    
+    The Admin SDK client is synchronous, so concurrency comes from running
+    its calls on these threads over the one shared gRPC channel. Sized by
+    FIRESTORE_MAX_WORKERS, read from the app settings rather than
+    FirebaseConfig so it doesn't require the service-account variables.
+    
+    Returns:
+        ThreadPoolExecutor: Shared Firestore thread pool
+    """
+    return ThreadPoolExecutor(
+        max_workers=settings.firestore_max_workers,
+        thread_name_prefix="firestore"
+    )
+
+
+def shutdown_firestore_executor() -> None:
+    """Stop the Firestore thread pool, waiting for in-flight calls."""
+    if get_firestore_executor.cache_info().currsize:
+        get_firestore_executor().shutdown(wait=True)
+        get_firestore_executor.cache_clear()
+
+
+def warm_firestore_client() -> None:
+    """Open the Firestore connection ahead of the first request.
+    
+    The Python Admin SDK only talks to Firestore over gRPC and opens the
+    channel lazily, so the first query would otherwise pay for the channel,
+    HTTP/2 and TLS setup. Reading a document that never exists forces the
+    handshake during startup instead.
+    """
+    try:
+        get_firestore_client().collection(WARMUP_COLLECTION).document(WARMUP_DOCUMENT).get()
+        logger.info("Firestore connection warmed up")
+    except Exception as e:
+        logger.warning(f"Failed to warm up Firestore connection: {str(e)}")
@@ -0,0 +1,17 @@
+"""Firestore collection names and field constants shared across the app."""
+from firebase_admin.firestore import SERVER_TIMESTAMP
+
+__all__ = [
+    "MESSAGES_COLLECTION",
+    "SUMMARIES_COLLECTION",
+    "QUOTED_MESSAGE_FIELDS",
+    "SERVER_TIMESTAMP",
+]
+
+# Collection names
+MESSAGES_COLLECTION = "messages"
+SUMMARIES_COLLECTION = "summaries"
+
+# Fields needed to render a message shown as context (quotes, summaries);
+# leaves out the potentially large metadata map
+QUOTED_MESSAGE_FIELDS = ["content", "role", "timestamp", "user_id", "quoted_message_id"]
@@ -1,12 +1,13 @@
 """Base LLM client interface and common functionality."""
-from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, AsyncIterator, Optional, Protocol
 
 
-class BaseLLMClient(ABC):
-    """Abstract base class for LLM clients."""
+class BaseLLMClient(Protocol):
+    """Interface implemented by LLM clients.
+    
+    Clients satisfy it structurally and do not subclass it.
+    """
     
-    @abstractmethod
     async def generate(
         self,
         prompt: str,
@@ -27,9 +28,8 @@ class BaseLLMClient(ABC):
         Returns:
             Generated text
         """
-        pass
+        ...
     
-    @abstractmethod
     async def generate_chat(
         self,
         messages: List[Dict[str, str]],
@@ -48,9 +48,28 @@ class BaseLLMClient(ABC):
         Returns:
             Generated message content
         """
-        pass
+        ...
+    
+    def generate_chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Stream a chat completion from a list of messages.
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            temperature: Controls randomness (0.0-1.0)
+            max_tokens: Maximum number of tokens to generate
+            **kwargs: Additional model-specific parameters
+            
+        Returns:
+            Async iterator over chunks of the generated message content
+        """
+        ...
     
-    @abstractmethod
     async def get_embeddings(
         self,
         texts: List[str],
@@ -65,4 +84,8 @@ class BaseLLMClient(ABC):
         Returns:
             List of embedding vectors
         """
-        pass
+        ...
+    
+    async def close(self) -> None:
+        """Release any network resources held by the client."""
+        ...
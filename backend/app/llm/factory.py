@@ -1,7 +1,10 @@
 """Factory for creating and managing LLM clients."""
+import asyncio
 from typing import Optional, Type, Dict, Any
 from enum import Enum
 
+import httpx
+
 from .base import BaseLLMClient
 from .groq_client import GroqClient
 from .gemini_client import GeminiClient
@@ -18,6 +21,25 @@ class LLMFactory:
     """Factory class for creating and managing LLM clients."""
     
     _clients: Dict[LLMProvider, BaseLLMClient] = {}
+    _lock = asyncio.Lock()
+    # One connection pool for every HTTP-based client, so DNS lookups, TLS
+    # sessions and HTTP/2 connections are reused across providers
+    _transport: Optional[httpx.AsyncHTTPTransport] = None
+    
+    @classmethod
+    def _get_shared_transport(cls) -> httpx.AsyncHTTPTransport:
+        """Get the HTTP transport shared by all HTTP-based clients."""
+        if cls._transport is None:
+            cls._transport = httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=0,
+                limits=httpx.Limits(
+                    max_connections=100,
+                    max_keepalive_connections=40,
+                    keepalive_expiry=60
+                )
+            )
+        return cls._transport
     
     @classmethod
     async def get_client(
@@ -37,23 +59,32 @@ class LLMFactory:
         Raises:
             ValueError: If an unsupported provider is specified
         """
-        if provider not in cls._clients:
-            if provider == LLMProvider.GROQ:
-                cls._clients[provider] = GroqClient()
-            elif provider == LLMProvider.GEMINI:
-                cls._clients[provider] = GeminiClient()
-            else:
-                raise ValueError(f"Unsupported LLM provider: {provider}")
+        if provider in cls._clients:
+            return cls._clients[provider]
+        
+        # Double-checked so concurrent first requests build only one client
+        async with cls._lock:
+            if provider not in cls._clients:
+                if provider == LLMProvider.GROQ:
+                    cls._clients[provider] = GroqClient(transport=cls._get_shared_transport())
+                elif provider == LLMProvider.GEMINI:
+                    cls._clients[provider] = GeminiClient()
+                else:
+                    raise ValueError(f"Unsupported LLM provider: {provider}")
             
         return cls._clients[provider]
     
     @classmethod
     async def close_all(cls):
         """Close all active LLM client connections."""
-        for client in cls._clients.values():
-            if hasattr(client, 'close') and callable(client.close):
+        async with cls._lock:
+            for client in cls._clients.values():
                 await client.close()
-        cls._clients.clear()
+            cls._clients.clear()
+            
+            if cls._transport is not None:
+                await cls._transport.aclose()
+                cls._transport = None
 
 
 # Default client functions for convenience
@@ -1,21 +1,25 @@
 """Google Gemini client for model integration."""
 import os
-from typing import List, Dict, Any, Optional, Union
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Dict, Any, AsyncIterator, Optional, Union
 import json
 import httpx
-from pydantic import BaseModel, Field, HttpUrl
+from pydantic import Field, HttpUrl
+from pydantic_settings import BaseSettings, SettingsConfigDict
 import google.generativeai as genai
 
-from .base import BaseLLMClient
 from ..utils.config import settings
 
 
-class GeminiClientConfig(BaseModel):
+class GeminiClientConfig(BaseSettings):
     """Configuration for Gemini API client."""
-    api_key: str = Field(..., env="GEMINI_API_KEY")
-    default_model: str = Field("gemini-1.5-pro", env="GEMINI_DEFAULT_MODEL")
-    timeout: int = Field(30, env="GEMINI_TIMEOUT")
-    max_retries: int = Field(3, env="GEMINI_MAX_RETRIES")
+    api_key: str = Field(..., validation_alias="GEMINI_API_KEY")
+    default_model: str = Field("gemini-1.5-pro", validation_alias="GEMINI_DEFAULT_MODEL")
+    embedding_model: str = Field("models/embedding-001", validation_alias="GEMINI_EMBEDDING_MODEL")
+    timeout: int = Field(30, validation_alias="GEMINI_TIMEOUT")
+    max_retries: int = Field(3, validation_alias="GEMINI_MAX_RETRIES")
+    max_chat_sessions: int = Field(1000, validation_alias="GEMINI_MAX_CHAT_SESSIONS")
     safety_settings: Dict[str, Any] = Field(
         default_factory=lambda: {
             "HARASSMENT": "BLOCK_NONE",
@@ -23,11 +27,24 @@ class GeminiClientConfig(BaseModel):
             "SEXUALLY_EXPLICIT": "BLOCK_NONE",
             "DANGEROUS_CONTENT": "BLOCK_NONE",
         },
-        env="GEMINI_SAFETY_SETTINGS"
+        validation_alias="GEMINI_SAFETY_SETTINGS"
     )
 
+    model_config = SettingsConfigDict(
+        env_file=os.getenv("ENV_FILE", ".env"),
+        env_file_encoding="utf-8",
+        case_sensitive=True,
+        extra="ignore"
+    )
+
+
+@lru_cache(maxsize=1)
+def get_gemini_config() -> GeminiClientConfig:
+    """Get the Gemini settings, read from the environment once per process."""
+    return GeminiClientConfig()
+
 
-class GeminiClient(BaseLLMClient):
+class GeminiClient:
     """Client for interacting with Google's Gemini models."""
     
     def __init__(self, config: Optional[GeminiClientConfig] = None):
@@ -36,9 +53,16 @@ class GeminiClient(BaseLLMClient):
         Args:
             config: Optional configuration. If not provided, loads from environment.
         """
-        self.config = config or GeminiClientConfig()
+        self.config = config or get_gemini_config()
         genai.configure(api_key=self.config.api_key)
+        # Both models are resolved once per client; the factory keeps a single
+        # client per process
         self.model = genai.GenerativeModel(self.config.default_model)
+        self.embedding_model = self.config.embedding_model
+        self._chats: OrderedDict[str, genai.ChatSession] = OrderedDict()
+    
+    async def close(self):
+        """Nothing to close; the Gemini SDK manages its own transport."""
     
     async def generate(
         self,
@@ -71,27 +95,28 @@ class GeminiClient(BaseLLMClient):
         messages: List[Dict[str, str]],
         temperature: float = 0.7,
         max_tokens: int = 1000,
+        conversation_id: Optional[str] = None,
         **kwargs
     ) -> str:
-        """Generate chat completion using Gemini's API."""
+        """Generate chat completion using Gemini's API.
+        
+        When ``conversation_id`` is given, the chat session is kept between
+        calls so only the newest message is sent; earlier turns are already
+        part of the session's history.
+        """
         try:
-            chat = self.model.start_chat(history=[])
+            history = self._to_gemini_history(messages)
+            if not history:
+                raise ValueError("No messages to send")
+            *previous, latest = history
             
-            # Convert messages to Gemini format
-            history = []
-            for msg in messages:
-                if msg["role"] == "system":
-                    # For system messages, we'll prepend to the first user message
-                    if history and history[-1]["role"] == "user":
-                        history[-1]["parts"][0].text = f"{msg['content']}\n\n{history[-1]['parts'][0].text}"
-                    continue
-                
-                role = "user" if msg["role"] == "user" else "model"
-                history.append({"role": role, "parts": [msg["content"]]})
+            if conversation_id is None:
+                chat = self.model.start_chat(history=previous)
+            else:
+                chat = self._get_chat_session(conversation_id, previous)
             
-            # Send the chat history
             response = await chat.send_message_async(
-                contents=history,
+                latest["parts"],
                 generation_config={
                     "temperature": min(max(0.0, temperature), 1.0),
                     "max_output_tokens": min(max(1, max_tokens), 8192),
@@ -104,21 +129,96 @@ class GeminiClient(BaseLLMClient):
         except Exception as e:
             raise RuntimeError(f"Failed to generate chat completion: {str(e)}")
     
+    async def generate_chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Stream a chat completion from Gemini's API, yielding text chunks
+        as they arrive."""
+        history = self._to_gemini_history(messages)
+        if not history:
+            raise ValueError("No messages to send")
+        *previous, latest = history
+        
+        try:
+            chat = self.model.start_chat(history=previous)
+            response = await chat.send_message_async(
+                latest["parts"],
+                generation_config={
+                    "temperature": min(max(0.0, temperature), 1.0),
+                    "max_output_tokens": min(max(1, max_tokens), 8192),
+                    **kwargs
+                },
+                safety_settings=self.config.safety_settings,
+                stream=True
+            )
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+                    
+        except Exception as e:
+            raise RuntimeError(f"Failed to stream chat completion: {str(e)}")
+    
+    def _get_chat_session(
+        self,
+        conversation_id: str,
+        history: List[Dict[str, Any]]
+    ) -> genai.ChatSession:
+        """Get the chat session for a conversation, starting one from
+        ``history`` if it isn't cached. Least recently used sessions are
+        dropped once ``max_chat_sessions`` is reached."""
+        chat = self._chats.get(conversation_id)
+        if chat is not None:
+            self._chats.move_to_end(conversation_id)
+            return chat
+        
+        chat = self.model.start_chat(history=history)
+        self._chats[conversation_id] = chat
+        if len(self._chats) > self.config.max_chat_sessions:
+            self._chats.popitem(last=False)
+        return chat
+    
+    @staticmethod
+    def _to_gemini_history(messages: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """Convert role/content messages to Gemini's content format."""
+        history = []
+        system_prompts = []
+        for msg in messages:
+            if msg["role"] == "system":
+                # Gemini has no system role; prepend to the next user message
+                system_prompts.append(msg["content"])
+                continue
+            
+            content = msg["content"]
+            if msg["role"] == "user" and system_prompts:
+                content = "\n\n".join([*system_prompts, content])
+                system_prompts = []
+            
+            role = "user" if msg["role"] == "user" else "model"
+            history.append({"role": role, "parts": [content]})
+        return history
+    
     async def get_embeddings(
         self,
         texts: List[str],
         **kwargs
     ) -> List[List[float]]:
         """Get embeddings using Gemini's API."""
-        try:
-            model = genai.GenerativeModel('models/embedding-001')
-            embeddings = []
+        if not texts:
+            return []
             
-            for text in texts:
-                result = await model.embed_content_async(text)
-                embeddings.append(result['embedding'])
-                
-            return embeddings
+        try:
+            # A list of contents is sent as a single batch embedding request
+            result = await genai.embed_content_async(
+                model=self.embedding_model,
+                content=texts,
+                task_type='retrieval_document',
+                **kwargs
+            )
+            return result['embedding']
             
         except Exception as e:
             raise RuntimeError(f"Failed to get embeddings: {str(e)}")
@@ -1,33 +1,63 @@
 """Groq client for LLaMA model integration."""
 import os
-from typing import List, Dict, Any, Optional, Union
+import asyncio
+import random
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Union, AsyncIterator
 import json
 import httpx
-from pydantic import BaseModel, Field
+import orjson
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
-from .base import BaseLLMClient
 from ..utils.config import settings
 
+# Exponential backoff bounds for retried requests, in seconds
+RETRY_BASE_DELAY = 0.25
+RETRY_MAX_DELAY = 8.0
+RETRY_JITTER = 0.1
 
-class GroqClientConfig(BaseModel):
+
+class GroqClientConfig(BaseSettings):
     """Configuration for Groq API client."""
-    api_key: str = Field(..., env="GROQ_API_KEY")
-    base_url: str = Field("https://api.groq.com/openai/v1", env="GROQ_API_BASE_URL")
-    default_model: str = Field("llama3-70b-8192", env="GROQ_DEFAULT_MODEL")
-    timeout: int = Field(30, env="GROQ_TIMEOUT")
-    max_retries: int = Field(3, env="GROQ_MAX_RETRIES")
+    api_key: str = Field(..., validation_alias="GROQ_API_KEY")
+    base_url: str = Field("https://api.groq.com/openai/v1", validation_alias="GROQ_API_BASE_URL")
+    default_model: str = Field("llama3-70b-8192", validation_alias="GROQ_DEFAULT_MODEL")
+    timeout: int = Field(30, validation_alias="GROQ_TIMEOUT")
+    max_retries: int = Field(3, validation_alias="GROQ_MAX_RETRIES")
+
+    model_config = SettingsConfigDict(
+        env_file=os.getenv("ENV_FILE", ".env"),
+        env_file_encoding="utf-8",
+        case_sensitive=True,
+        extra="ignore"
+    )
+
 
+@lru_cache(maxsize=1)
+def get_groq_config() -> GroqClientConfig:
+    """Get the Groq settings, read from the environment once per process."""
+    return GroqClientConfig()
 
-class GroqClient(BaseLLMClient):
+
+class GroqClient:
     """Client for interacting with Groq's LLaMA models."""
     
-    def __init__(self, config: Optional[GroqClientConfig] = None):
+    def __init__(
+        self,
+        config: Optional[GroqClientConfig] = None,
+        transport: Optional[httpx.AsyncHTTPTransport] = None
+    ):
         """Initialize the Groq client.
         
         Args:
             config: Optional configuration. If not provided, loads from environment.
+            transport: Optional shared HTTP transport. The caller owns it and is
+                responsible for closing it; if not provided, the client creates
+                and closes its own.
         """
-        self.config = config or GroqClientConfig()
+        self.config = config or get_groq_config()
+        self._owns_transport = transport is None
         self.client = httpx.AsyncClient(
             base_url=self.config.base_url,
             headers={
@@ -35,7 +65,17 @@ class GroqClient(BaseLLMClient):
                 "Content-Type": "application/json"
             },
             timeout=self.config.timeout,
-            follow_redirects=True
+            follow_redirects=True,
+            # Retries are handled in generate_chat, not by the transport
+            transport=transport or httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=0,
+                limits=httpx.Limits(
+                    max_connections=50,
+                    max_keepalive_connections=20,
+                    keepalive_expiry=60
+                )
+            )
         )
     
     async def __aenter__(self):
@@ -45,8 +85,9 @@ class GroqClient(BaseLLMClient):
         await self.close()
     
     async def close(self):
-        """Close the HTTP client."""
-        await self.client.aclose()
+        """Close the HTTP client, unless its transport is shared."""
+        if self._owns_transport:
+            await self.client.aclose()
     
     async def generate(
         self,
@@ -77,13 +118,7 @@ class GroqClient(BaseLLMClient):
         **kwargs
     ) -> str:
         """Generate chat completion using Groq's API."""
-        payload = {
-            "model": self.config.default_model,
-            "messages": messages,
-            "temperature": min(max(0.0, temperature), 2.0),  # Clamp to 0-2
-            "max_tokens": min(max(1, max_tokens), 8192),  # Clamp to 1-8192
-            **kwargs
-        }
+        payload = self._build_payload(messages, temperature, max_tokens, **kwargs)
         
         for attempt in range(self.config.max_retries):
             try:
@@ -96,12 +131,86 @@ class GroqClient(BaseLLMClient):
                 data = response.json()
                 return data["choices"][0]["message"]["content"]
                 
-            except (httpx.HTTPStatusError, json.JSONDecodeError) as e:
-                if attempt == self.config.max_retries - 1:
+            except (httpx.HTTPStatusError, httpx.TransportError, json.JSONDecodeError) as e:
+                retryable = (
+                    not isinstance(e, httpx.HTTPStatusError)
+                    or e.response.status_code == 429
+                    or e.response.status_code >= 500
+                )
+                if not retryable or attempt == self.config.max_retries - 1:
                     raise RuntimeError(
-                        f"Failed to generate completion after {self.config.max_retries} attempts: {str(e)}"
+                        f"Failed to generate completion after {attempt + 1} attempts: {str(e)}"
                     )
-                continue
+                await asyncio.sleep(self._get_retry_delay(e, attempt))
+    
+    async def generate_chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Stream a chat completion from Groq's API, yielding content deltas
+        as they arrive over server-sent events."""
+        payload = self._build_payload(messages, temperature, max_tokens, **kwargs)
+        payload["stream"] = True
+        
+        try:
+            async with self.client.stream(
+                "POST",
+                "/chat/completions",
+                json=payload,
+                timeout=self.config.timeout
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    
+                    chunk = orjson.loads(data)
+                    content = chunk["choices"][0].get("delta", {}).get("content")
+                    if content:
+                        yield content
+                        
+        except (httpx.HTTPError, orjson.JSONDecodeError) as e:
+            raise RuntimeError(f"Failed to stream completion: {str(e)}")
+    
+    def _build_payload(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Build the chat completion request body."""
+        return {
+            "model": self.config.default_model,
+            "messages": messages,
+            "temperature": min(max(0.0, temperature), 2.0),  # Clamp to 0-2
+            "max_tokens": min(max(1, max_tokens), 8192),  # Clamp to 1-8192
+            **kwargs
+        }
+    
+    @staticmethod
+    def _get_retry_delay(error: Exception, attempt: int) -> float:
+        """Get the delay before the next retry.
+        
+        Uses the server's Retry-After header when sent, clamped to
+        RETRY_MAX_DELAY so a large value can't stall the request; otherwise
+        capped exponential backoff with jitter so concurrent retries spread out.
+        """
+        if isinstance(error, httpx.HTTPStatusError):
+            retry_after = error.response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    return min(max(0.0, float(retry_after)), RETRY_MAX_DELAY)
+                except ValueError:
+                    pass
+        delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+        return delay + random.random() * RETRY_JITTER
     
     async def get_embeddings(
         self,
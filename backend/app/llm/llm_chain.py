@@ -4,98 +4,144 @@ This module implements the dual-LLM architecture where:
 1. Gemini handles analysis, planning, and memory operations
 2. Groq/LLaMA generates the final user-facing response
 """
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Union, AsyncIterator
+import asyncio
+import hashlib
 import json
 import logging
+import re
 from enum import Enum
+from string import Template
 
-from pydantic import BaseModel, Field
+import msgspec
 
 from .factory import get_llm_client, LLMProvider
 from .base import BaseLLMClient
+from ..utils.cache import cache_manager
 
 logger = logging.getLogger(__name__)
 
+# Sampling temperature used for the user-facing response
+GENERATION_TEMPERATURE = 0.7
 
-class AnalysisResult(BaseModel):
-    """Structured result from the analysis phase with Gemini."""
+# Number of recent conversation turns passed to each model
+HISTORY_WINDOW = 5
+
+# Messages shorter than this with no prior history skip the Gemini analysis
+TRIVIAL_MESSAGE_LENGTH = 40
+
+# Outermost JSON object in a model response, with or without a code fence
+JSON_OBJECT_PATTERN = re.compile(r"\{.*\}", re.S)
+
+# Prompt templates are parsed once at import; only the dynamic parts are
+# substituted per message
+ANALYSIS_PROMPT_TEMPLATE = Template("""You are the analysis engine for Nova Chatbot. Your task is to analyze the user's message
+and conversation context to prepare for generating a helpful response.
+
+Conversation History:
+$history
+
+User Message: $message
+
+Your analysis should include:
+1. Key points or facts from the message
+2. Any required context from the conversation history
+3. The appropriate response style/tone
+4. Whether this interaction should be added to the conversation memory
+
+Respond with a JSON object containing:
+{
+    "key_points": ["list", "of", "key", "points"],
+    "required_context": ["relevant", "context", "from", "history"],
+    "response_style": "friendly|professional|witty|etc",
+    "needs_memory_update": true|false,
+    "metadata": {
+        // Any additional metadata for the response generator
+    }
+}""")
+
+SYSTEM_PROMPT_TEMPLATE = Template("""You are Nova, a helpful AI assistant. Below is an analysis of the user's message:
+
+Key Points:
+$key_points
+
+Context from Conversation:
+$context
+
+Response Style: $style
+
+Please respond to the user in a $style manner.""")
+
+NO_CONTEXT_TEXT = "No specific context needed."
+
+# Returned when Groq/LLaMA fails; never cached
+FALLBACK_RESPONSE = "I'm having trouble generating a response right now. Could you please rephrase your question?"
+
+
+class AnalysisResult(msgspec.Struct):
+    """Structured result from the analysis phase with Gemini.
+    
+    A msgspec struct so Gemini's JSON is decoded and validated in one pass.
+    """
     # Core analysis components
-    key_points: List[str] = Field(
-        ...,
-        description="List of key points or facts extracted from the conversation"
-    )
-    required_context: List[str] = Field(
-        default_factory=list,
-        description="Any additional context needed from the conversation history"
-    )
-    response_style: str = Field(
-        "friendly",
-        description="Tone/style for the response (e.g., friendly, professional, witty)"
-    )
-    needs_memory_update: bool = Field(
-        False,
-        description="Whether this interaction should update the conversation memory"
-    )
+    # List of key points or facts extracted from the conversation
+    key_points: List[str]
+    # Any additional context needed from the conversation history
+    required_context: List[str] = msgspec.field(default_factory=list)
+    # Tone/style for the response (e.g., friendly, professional, witty)
+    response_style: str = "friendly"
+    # Whether this interaction should update the conversation memory
+    needs_memory_update: bool = False
     # Additional metadata for the response generator
-    metadata: Dict[str, Any] = Field(
-        default_factory=dict,
-        description="Additional metadata for the response generator"
-    )
+    metadata: Dict[str, Any] = msgspec.field(default_factory=dict)
+
+
+def format_history(messages: List[Dict[str, str]]) -> str:
+    """Render conversation turns as ``role: content`` lines for a prompt."""
+    return "\n".join(f"{m['role']}: {m['content']}" for m in messages)
 
 
 class DualLLMChain:
     """Orchestrates the dual-LLM architecture for Nova Chatbot."""
     
-    def __init__(self):
-        self.analyzer = None  # Will be initialized as Gemini
-        self.generator = None  # Will be initialized as Groq/LLaMA
-        self._initialized = False
+    def __init__(self, analyzer: BaseLLMClient, generator: BaseLLMClient):
+        """Create a chain from ready-to-use clients.
+        
+        Args:
+            analyzer: Gemini client used for analysis
+            generator: Groq/LLaMA client used for the final response
+        """
+        if analyzer is None or generator is None:
+            raise ValueError("DualLLMChain requires both an analyzer and a generator client")
+        self.analyzer = analyzer
+        self.generator = generator
     
-    async def initialize(self):
-        """Initialize both LLM clients."""
-        if not self._initialized:
-            self.analyzer = await get_llm_client(provider=LLMProvider.GEMINI)
-            self.generator = await get_llm_client(provider=LLMProvider.GROQ)
-            self._initialized = True
+    @classmethod
+    async def create(cls) -> 'DualLLMChain':
+        """Create a chain backed by the shared factory clients."""
+        return cls(
+            analyzer=await get_llm_client(provider=LLMProvider.GEMINI),
+            generator=await get_llm_client(provider=LLMProvider.GROQ)
+        )
     
     async def analyze_with_gemini(
         self,
         user_message: str,
         conversation_history: List[Dict[str, str]],
+        history_text: Optional[str] = None,
         **kwargs
     ) -> AnalysisResult:
-        """Use Gemini to analyze the message and conversation context."""
-        if not self._initialized:
-            await self.initialize()
+        """Use Gemini to analyze the message and conversation context.
+        
+        ``history_text`` is the pre-rendered recent history; it is built from
+        ``conversation_history`` when not supplied.
+        """
+        if history_text is None:
+            history_text = format_history(conversation_history[-HISTORY_WINDOW:])
         
         # Prepare the analysis prompt
-        prompt = """
-        You are the analysis engine for Nova Chatbot. Your task is to analyze the user's message 
-        and conversation context to prepare for generating a helpful response.
-        
-        Conversation History:
-        {history}
-        
-        User Message: {message}
-        
-        Your analysis should include:
-        1. Key points or facts from the message
-        2. Any required context from the conversation history
-        3. The appropriate response style/tone
-        4. Whether this interaction should be added to the conversation memory
-        
-        Respond with a JSON object containing:
-        {{
-            "key_points": ["list", "of", "key", "points"],
-            "required_context": ["relevant", "context", "from", "history"],
-            "response_style": "friendly|professional|witty|etc",
-            "needs_memory_update": true|false,
-            "metadata": {{
-                // Any additional metadata for the response generator
-            }}
-        }}
-        """.format(
-            history="\n".join([f"{m['role']}: {m['content']}" for m in conversation_history[-5:]]),
+        prompt = ANALYSIS_PROMPT_TEMPLATE.substitute(
+            history=history_text,
             message=user_message
         )
         
@@ -111,33 +157,36 @@ class DualLLMChain:
             # Parse the JSON response
             try:
                 # Sometimes the response might include markdown code blocks
-                if '```json' in response:
-                    json_str = response.split('```json')[1].split('```')[0].strip()
-                else:
-                    json_str = response.strip()
-                
-                analysis_data = json.loads(json_str)
-                return AnalysisResult(**analysis_data)
+                match = JSON_OBJECT_PATTERN.search(response)
+                return msgspec.json.decode(
+                    match.group(0) if match else response,
+                    type=AnalysisResult
+                )
                 
-            except (json.JSONDecodeError, KeyError) as e:
+            except msgspec.DecodeError as e:
                 logger.error(f"Failed to parse analysis result: {e}")
                 # Fallback to a basic analysis
-                return AnalysisResult(
-                    key_points=[user_message],
-                    required_context=[],
-                    response_style="friendly",
-                    needs_memory_update=False
-                )
+                return self.default_analysis(user_message)
                 
         except Exception as e:
             logger.error(f"Analysis failed: {e}")
             # If analysis fails, just pass through the message
-            return AnalysisResult(
-                key_points=[user_message],
-                required_context=[],
-                response_style="friendly",
-                needs_memory_update=False
-            )
+            return self.default_analysis(user_message)
+    
+    @staticmethod
+    def default_analysis(user_message: str) -> AnalysisResult:
+        """Build the pass-through analysis used when Gemini adds nothing."""
+        return AnalysisResult(
+            key_points=[user_message],
+            required_context=[],
+            response_style="friendly",
+            needs_memory_update=False
+        )
+    
+    @staticmethod
+    def _is_trivial_message(user_message: str, conversation_history: List[Dict[str, str]]) -> bool:
+        """Whether a message is too small for Gemini's analysis to change anything."""
+        return len(user_message) < TRIVIAL_MESSAGE_LENGTH and not conversation_history
     
     async def generate_with_groq(
         self,
@@ -147,36 +196,13 @@ class DualLLMChain:
         **kwargs
     ) -> str:
         """Use Groq/LLaMA to generate a response based on Gemini's analysis."""
-        if not self._initialized:
-            await self.initialize()
-        
-        # Prepare the system prompt with analysis results
-        system_prompt = f"""
-        You are Nova, a helpful AI assistant. Below is an analysis of the user's message:
-        
-        Key Points:
-        {chr(10).join(f"- {point}" for point in analysis.key_points)}
-        
-        Context from Conversation:
-        {chr(10).join(f"- {ctx}" for ctx in analysis.required_context) if analysis.required_context else 'No specific context needed.'}
-        
-        Response Style: {analysis.response_style}
-        
-        Please respond to the user in a {analysis.response_style} manner.
-        """.strip()
-        
-        # Prepare the conversation history for the generator
-        messages = [
-            {"role": "system", "content": system_prompt},
-            *conversation_history[-5:],  # Include recent conversation history
-            {"role": "user", "content": user_message}
-        ]
+        messages = self._build_generation_messages(user_message, analysis, conversation_history)
         
         try:
             # Generate the response using Groq/LLaMA
             response = await self.generator.generate_chat(
                 messages=messages,
-                temperature=0.7,  # Slightly higher temperature for more creative responses
+                temperature=GENERATION_TEMPERATURE,  # Slightly higher temperature for more creative responses
                 max_tokens=1000,
                 **kwargs
             )
@@ -185,7 +211,52 @@ class DualLLMChain:
         except Exception as e:
             logger.error(f"Response generation failed: {e}")
             # Fallback response if generation fails
-            return "I'm having trouble generating a response right now. Could you please rephrase your question?"
+            return FALLBACK_RESPONSE
+    
+    @staticmethod
+    def _build_generation_messages(
+        user_message: str,
+        analysis: AnalysisResult,
+        conversation_history: List[Dict[str, str]]
+    ) -> List[Dict[str, str]]:
+        """Build the Groq/LLaMA chat messages from Gemini's analysis."""
+        # Prepare the system prompt with analysis results
+        system_prompt = SYSTEM_PROMPT_TEMPLATE.substitute(
+            key_points="\n".join(f"- {point}" for point in analysis.key_points),
+            context=(
+                "\n".join(f"- {ctx}" for ctx in analysis.required_context)
+                if analysis.required_context else NO_CONTEXT_TEXT
+            ),
+            style=analysis.response_style
+        )
+        
+        # Prepare the conversation history for the generator
+        return [
+            {"role": "system", "content": system_prompt},
+            *conversation_history[-HISTORY_WINDOW:],  # Include recent conversation history
+            {"role": "user", "content": user_message}
+        ]
+    
+    def _get_response_cache_key(
+        self,
+        user_message: str,
+        conversation_history: List[Dict[str, str]],
+        generation_kwargs: Dict[str, Any]
+    ) -> str:
+        """Build a deterministic cache key for a chain invocation."""
+        payload = json.dumps(
+            {
+                "msg": user_message,
+                "hist": conversation_history,
+                "t": GENERATION_TEMPERATURE,
+                "m": getattr(getattr(self.generator, "config", None), "default_model", None),
+                "kw": generation_kwargs,
+            },
+            sort_keys=True,
+            default=str
+        )
+        digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        return cache_manager.get_cache_key("llm_response", digest=digest)
     
     async def process_message(
         self,
@@ -194,24 +265,126 @@ class DualLLMChain:
         **kwargs
     ) -> str:
         """Process a message through the dual-LLM chain."""
-        # Step 1: Analyze with Gemini
-        analysis = await self.analyze_with_gemini(
-            user_message=user_message,
-            conversation_history=conversation_history,
-            **kwargs.get('analysis_kwargs', {})
+        # Trim and render the history once for both models
+        recent_history = conversation_history[-HISTORY_WINDOW:]
+        history_text = format_history(recent_history)
+        
+        # Identical requests (retries, debugging) are answered from the cache
+        cache_key = self._get_response_cache_key(
+            user_message,
+            recent_history,
+            kwargs.get('generation_kwargs', {})
         )
+        cached_response = await cache_manager.get(cache_key)
+        if cached_response is not None:
+            return cached_response
         
-        # Step 2: Generate response with Groq/LLaMA
-        response = await self.generate_with_groq(
+        # Short opening messages ("hi", "thanks") get the default analysis
+        # without a Gemini round-trip
+        if self._is_trivial_message(user_message, recent_history):
+            analysis = self.default_analysis(user_message)
+            response = await self.generate_with_groq(
+                user_message=user_message,
+                analysis=analysis,
+                conversation_history=recent_history,
+                **kwargs.get('generation_kwargs', {})
+            )
+            if response != FALLBACK_RESPONSE:
+                await cache_manager.set(cache_key, response)
+            return response
+        
+        # Step 1: Analyze with Gemini while speculatively generating with the
+        # default analysis, which is what most friendly turns end up using
+        analysis_task = asyncio.create_task(self.analyze_with_gemini(
+            user_message=user_message,
+            conversation_history=recent_history,
+            history_text=history_text,
+            **kwargs.get('analysis_kwargs', {})
+        ))
+        speculative_task = asyncio.create_task(self.generate_with_groq(
             user_message=user_message,
-            analysis=analysis,
-            conversation_history=conversation_history,
+            analysis=self.default_analysis(user_message),
+            conversation_history=recent_history,
             **kwargs.get('generation_kwargs', {})
-        )
+        ))
+        
+        try:
+            analysis = await analysis_task
+        except BaseException:
+            speculative_task.cancel()
+            raise
+        
+        # Step 2: Keep the speculative response unless the analysis changes
+        # the style or asks for extra context
+        if analysis.response_style == "friendly" and not analysis.required_context:
+            response = await speculative_task
+        else:
+            speculative_task.cancel()
+            response = await self.generate_with_groq(
+                user_message=user_message,
+                analysis=analysis,
+                conversation_history=recent_history,
+                **kwargs.get('generation_kwargs', {})
+            )
         
         # Step 3: Update conversation memory if needed
         if analysis.needs_memory_update:
             # TODO: Implement memory update logic
             pass
         
+        if response != FALLBACK_RESPONSE:
+            await cache_manager.set(cache_key, response)
+        
         return response
+
+    
+    async def process_message_stream(
+        self,
+        user_message: str,
+        conversation_history: List[Dict[str, str]],
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Process a message through the dual-LLM chain, yielding the response
+        as Groq/LLaMA produces it."""
+        recent_history = conversation_history[-HISTORY_WINDOW:]
+        history_text = format_history(recent_history)
+        generation_kwargs = kwargs.get('generation_kwargs', {})
+        
+        cache_key = self._get_response_cache_key(user_message, recent_history, generation_kwargs)
+        cached_response = await cache_manager.get(cache_key)
+        if cached_response is not None:
+            yield cached_response
+            return
+        
+        # Step 1: Analyze with Gemini, unless the message is trivial
+        if self._is_trivial_message(user_message, recent_history):
+            analysis = self.default_analysis(user_message)
+        else:
+            analysis = await self.analyze_with_gemini(
+                user_message=user_message,
+                conversation_history=recent_history,
+                history_text=history_text,
+                **kwargs.get('analysis_kwargs', {})
+            )
+        
+        # Step 2: Stream the response from Groq/LLaMA
+        messages = self._build_generation_messages(user_message, analysis, recent_history)
+        chunks = []
+        try:
+            async for chunk in self.generator.generate_chat_stream(
+                messages=messages,
+                temperature=GENERATION_TEMPERATURE,
+                max_tokens=1000,
+                **generation_kwargs
+            ):
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            logger.error(f"Response streaming failed: {e}")
+            # Only fall back if the client hasn't received anything yet
+            if not chunks:
+                yield FALLBACK_RESPONSE
+            return
+        
+        if chunks:
+            await cache_manager.set(cache_key, "".join(chunks))
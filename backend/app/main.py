@@ -4,10 +4,15 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from pydantic import ValidationError
 
-from app.routes import messages, summaries
+from app.firebase.config import shutdown_firestore_executor, warm_firestore_client
+from app.llm import DualLLMChain, close_llm_clients
+from app.routes import chat, messages, summaries
+from app.services.firebase_service import FirebaseService, MESSAGE_INVALIDATION_CHANNEL
+from app.services.topic_service import topic_service
 from app.utils.config import settings
 from app.utils.cache import cache_manager
 
@@ -21,15 +26,40 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application startup and shutdown events."""
-    # Startup: Initialize cache
+    # Startup: Initialize cache and open the Firestore connection
     logger.info("Starting up application...")
     await cache_manager.initialize()
+    await asyncio.to_thread(warm_firestore_client)
+    
+    # Evict locally cached messages when any instance updates them
+    await cache_manager.subscribe(
+        MESSAGE_INVALIDATION_CHANNEL,
+        FirebaseService.evict_cached_message
+    )
+    
+    # Load topics and warm up topic analysis before serving requests
+    try:
+        await topic_service.initialize()
+        logger.info("Topic service initialized successfully")
+    except Exception as e:
+        logger.error(f"Failed to initialize topic service: {str(e)}")
+    
+    # Build both LLM clients up front so the first chat message doesn't pay
+    # for client construction and connection setup
+    app.state.llm_chain = None
+    try:
+        app.state.llm_chain = await DualLLMChain.create()
+        logger.info("LLM clients initialized successfully")
+    except Exception as e:
+        logger.error(f"Failed to initialize LLM clients: {str(e)}")
     
     yield  # Application runs here
     
     # Shutdown: Clean up resources
     logger.info("Shutting down application...")
-    # Add any cleanup code here if needed
+    await close_llm_clients()
+    await cache_manager.close()
+    await asyncio.to_thread(shutdown_firestore_executor)
 
 def create_application() -> FastAPI:
     """Create and configure the FastAPI application."""
@@ -50,6 +80,7 @@ def create_application() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "ETag"],
     )
     
     # Add cache control headers middleware
@@ -71,6 +102,11 @@ def create_application() -> FastAPI:
         prefix=f"{settings.api_prefix}/summaries",
         tags=["summaries"]
     )
+    app.include_router(
+        chat.router,
+        prefix=f"{settings.api_prefix}/chat",
+        tags=["chat"]
+    )
     
     return app
 
@@ -91,7 +127,7 @@ async def validation_exception_handler(request, exc):
     logger.error(f"Validation error: {exc}")
     return JSONResponse(
         status_code=422,
-        content={"detail": "Validation Error", "errors": exc.errors()},
+        content={"detail": "Validation Error", "errors": jsonable_encoder(exc.errors())},
     )
 
 
@@ -100,7 +136,7 @@ async def pydantic_validation_exception_handler(request, exc):
     logger.error(f"Pydantic validation error: {exc}")
     return JSONResponse(
         status_code=422,
-        content={"detail": "Validation Error", "errors": exc.errors()},
+        content={"detail": "Validation Error", "errors": jsonable_encoder(exc.errors())},
     )
 
 
@@ -1,4 +1,4 @@
-from . import messages, summaries
+from . import chat, messages, summaries
 
 # Export all routers
-__all__ = ["messages", "summaries"]
\ No newline at end of file
+__all__ = ["chat", "messages", "summaries"]
\ No newline at end of file
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from app.utils.models import ChatRequest
+
+router = APIRouter()
+
+
+@router.post("/stream")
+async def stream_chat(chat_request: ChatRequest, request: Request):
+    """
+    Send a message to Nova and stream the reply as plain text.
+    
+    Tokens are forwarded as soon as Groq/LLaMA produces them.
+    
+    - **message**: The user's message
+    - **conversation_history**: Recent turns as `role`/`content` pairs, oldest first
+    """
+    llm_chain = request.app.state.llm_chain
+    if llm_chain is None:
+        raise HTTPException(status_code=503, detail="Chat is temporarily unavailable")
+    
+    conversation_history = [
+        {"role": turn.role.value, "content": turn.content}
+        for turn in chat_request.conversation_history
+    ]
+    
+    return StreamingResponse(
+        llm_chain.process_message_stream(
+            user_message=chat_request.message,
+            conversation_history=conversation_history,
+        ),
+        media_type="text/plain; charset=utf-8"
+    )
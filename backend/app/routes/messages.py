@@ -1,21 +1,52 @@
+"""Message and topic endpoints.
+
+The hot read endpoints (message list, topics) return data straight from our
+own service layer, which reads it from Firestore documents we wrote, so they
+skip response-model validation and are serialized directly. Their response
+models only document the payload. Endpoints that echo client input keep
+response_model validation.
+"""
+from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
 import logging
 
-from app.services.firebase_service import FirebaseService
+import msgspec
+import orjson
+from pydantic import BaseModel
+
+from app.firebase.constants import QUOTED_MESSAGE_FIELDS
+from app.services.firebase_service import (
+    BATCH_WRITE_CHUNK_SIZE,
+    FirebaseService,
+    MessageLoader,
+    decode_message_cursor,
+    encode_message_cursor,
+    to_quoted_message,
+)
 from app.services.topic_service import topic_service
 from app.utils.models import (
     MessageCreate,
     MessageResponse,
-    MessageUpdate,
-    MessageRole,
+    MessageResponseFlat,
 )
-from app.utils.cache_manager import cache_manager
+from app.utils.cache import cache_manager, conditional_response
+from app.utils.serialization import json_default
 
-router = APIRouter()
+# orjson serializes the datetimes Firestore returns natively
+router = APIRouter(default_response_class=ORJSONResponse)
 logger = logging.getLogger(__name__)
 
+def get_message_loader() -> MessageLoader:
+    """Provide a fresh message loader for each request."""
+    return MessageLoader()
+
+def get_quoted_message_loader() -> MessageLoader:
+    """Provide a fresh loader for quoted messages, which only need the
+    fields shown alongside the quoting message."""
+    return MessageLoader(fields=QUOTED_MESSAGE_FIELDS)
+
 async def analyze_message_topic(message_id: str, content: str, user_id: str):
     """
     Background task to analyze and assign a topic to a message.
@@ -26,9 +57,6 @@ async def analyze_message_topic(message_id: str, content: str, user_id: str):
         user_id: ID of the user who sent the message
     """
     try:
-        # Initialize topic service if needed
-        await topic_service.initialize()
-        
         # Analyze the message and assign a topic
         topic_id = await topic_service.analyze_message_topic(
             message_id=message_id,
@@ -40,10 +68,8 @@ async def analyze_message_topic(message_id: str, content: str, user_id: str):
         if topic_id:
             logger.info(f"Assigned topic {topic_id} to message {message_id}")
             
-            # Update any topic-related caches
-            await cache_manager.invalidate_by_prefix(f"topics:{user_id}")
-            
-            # Invalidate the user's recent messages cache
+            # Topic caches were invalidated by the topic service; only the
+            # user's recent messages cache is left
             cache_key = cache_manager.get_cache_key("recent_messages", user_id=user_id)
             await cache_manager.delete(cache_key)
             
@@ -55,6 +81,7 @@ async def analyze_message_topic(message_id: str, content: str, user_id: str):
 async def create_message(
     message: MessageCreate,
     background_tasks: BackgroundTasks,
+    quoted_loader: MessageLoader = Depends(get_quoted_message_loader),
 ):
     """
     Create a new message and trigger topic analysis in the background.
@@ -67,8 +94,8 @@ async def create_message(
     """
     try:
         # Add message to Firestore without topic_id initially
-        message_data = message.dict(exclude_unset=True)
-        message_id = await FirebaseService.add_message(
+        message_data = message.model_dump(exclude_unset=True)
+        created_message = await FirebaseService.add_message(
             user_id=message.user_id,
             content=message.content,
             role=message.role,
@@ -78,29 +105,24 @@ async def create_message(
         
         # Only analyze topics for user messages (not assistant responses)
         if message.role == "user":
+            # Invalidate the recent messages cache after the response is
+            # sent; the response doesn't depend on it
+            cache_key = cache_manager.get_cache_key("recent_messages", user_id=message.user_id)
+            background_tasks.add_task(cache_manager.delete, cache_key)
+            
             # Start background task for topic analysis
             background_tasks.add_task(
                 analyze_message_topic,
-                message_id=message_id,
+                message_id=created_message["id"],
                 content=message.content,
                 user_id=message.user_id
             )
         
-        # Get the created message to return (with any topic_id if set)
-        created_message = await FirebaseService.get_message(message_id)
-        if not created_message:
-            raise HTTPException(status_code=500, detail="Failed to retrieve created message")
-            
         # If there's a quoted message, fetch it
-        if created_message.get("quoted_message_id"):
-            quoted_message = await FirebaseService.get_message(created_message["quoted_message_id"])
+        if message.quoted_message_id:
+            quoted_message = await quoted_loader.load(message.quoted_message_id)
             if quoted_message:
                 created_message["quoted_message"] = quoted_message
-        
-        # Invalidate any relevant caches
-        if message.role == "user":
-            cache_key = cache_manager.get_cache_key("recent_messages", user_id=message.user_id)
-            await cache_manager.delete(cache_key)
             
         return created_message
         
@@ -108,64 +130,180 @@ async def create_message(
         logger.error(f"Error creating message: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/", response_model=List[MessageResponse])
+@router.post("/bulk", response_model=List[MessageResponseFlat], status_code=201)
+async def create_messages_bulk(
+    messages: List[MessageCreate],
+    background_tasks: BackgroundTasks,
+):
+    """
+    Create several messages with batched Firestore writes.
+    
+    Accepts a list of up to 500 messages with the same fields as a single
+    create; they are written all or nothing. Topic analysis runs in the
+    background for each user message. Quoted messages are not expanded in
+    the response.
+    """
+    if not messages:
+        return []
+    if len(messages) > BATCH_WRITE_CHUNK_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {BATCH_WRITE_CHUNK_SIZE} messages can be created at once"
+        )
+    
+    try:
+        created_messages = await FirebaseService.add_messages_bulk(
+            [message.model_dump() for message in messages]
+        )
+        
+        # Invalidate the recent messages cache once per affected user, after
+        # the response is sent
+        user_ids = {message.user_id for message in messages if message.role == "user"}
+        for user_id in user_ids:
+            background_tasks.add_task(
+                cache_manager.delete,
+                cache_manager.get_cache_key("recent_messages", user_id=user_id)
+            )
+        
+        for created_message in created_messages:
+            if created_message["role"] == "user":
+                background_tasks.add_task(
+                    analyze_message_topic,
+                    message_id=created_message["id"],
+                    content=created_message["content"],
+                    user_id=created_message["user_id"]
+                )
+        
+        return created_messages
+        
+    except Exception as e:
+        logger.error(f"Error creating messages in bulk: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get(
+    "/",
+    response_model=None,
+    responses={200: {"model": List[MessageResponse]}}
+)
 async def get_messages(
     user_id: str,
     limit: int = Query(50, gt=0, le=100, description="Number of messages to return"),
     start_after: Optional[str] = Query(None, description="Message ID to start after for pagination"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
 ):
     """
     Get messages for a user, most recent first.
     
+    When a full page is returned, the **X-Next-Cursor** response header holds
+    the cursor for the next page.
+    
     - **user_id**: ID of the user to get messages for
     - **limit**: Number of messages to return (1-100, default 50)
-    - **start_after**: Message ID to start after for pagination
+    - **start_after**: Message ID to start after for pagination (deprecated, use cursor)
+    - **cursor**: Cursor for the next page; takes precedence over start_after
     """
     try:
         messages = await FirebaseService.get_messages(
             user_id=user_id,
             limit=limit,
             start_after=start_after,
+            cursor=cursor,
         )
         
-        # Get all quoted messages in a batch
-        quoted_message_ids = [
+        headers = {}
+        if len(messages) == limit:
+            headers["X-Next-Cursor"] = encode_message_cursor(messages[-1])
+        
+        # Quoted messages already on this page are reused; the rest are
+        # fetched in a batch. The page copies are taken before anything is
+        # attached, so messages quoting each other can't form a cycle, and
+        # are cut down to the fields a fetched quote has.
+        page_messages = {msg["id"]: to_quoted_message(msg) for msg in messages}
+        quoted_message_ids = {
             msg["quoted_message_id"] 
             for msg in messages 
             if msg.get("quoted_message_id")
-        ]
+        } - page_messages.keys()
         
-        quoted_messages = {}
-        for msg_id in quoted_message_ids:
-            quoted_msg = await FirebaseService.get_message(msg_id)
-            if quoted_msg:
-                quoted_messages[msg_id] = quoted_msg
+        quoted_messages = await FirebaseService.get_quoted_messages(
+            list(quoted_message_ids)
+        )
+        for msg_id, msg in page_messages.items():
+            quoted_messages.setdefault(msg_id, msg)
         
         # Attach quoted messages to their parent messages
         for msg in messages:
             if msg.get("quoted_message_id") and msg["quoted_message_id"] in quoted_messages:
                 msg["quoted_message"] = quoted_messages[msg["quoted_message_id"]]
         
-        return messages
+        # Trusted service-layer data: encoded with msgspec, not validated
+        return Response(
+            content=msgspec.json.encode(messages, enc_hook=json_default),
+            media_type="application/json",
+            headers=headers
+        )
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/stream")
+async def stream_messages(
+    user_id: str,
+    limit: int = Query(50, gt=0, le=100, description="Number of messages to return"),
+    start_after: Optional[str] = Query(None, description="Message ID to start after for pagination"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page"),
+):
+    """
+    Stream messages for a user as newline-delimited JSON, most recent first.
+    
+    Each line is one message, sent as soon as Firestore returns it. Quoted
+    messages are not inlined; clients resolve **quoted_message_id** against
+    the messages they already have.
+    
+    - **user_id**: ID of the user to get messages for
+    - **limit**: Number of messages to return (1-100, default 50)
+    - **start_after**: Message ID to start after for pagination (deprecated, use cursor)
+    - **cursor**: Cursor for the next page; takes precedence over start_after
+    """
+    # Reject a bad cursor before the stream starts and the status is sent
+    if cursor:
+        try:
+            decode_message_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    async def generate():
+        async for message in FirebaseService.stream_messages(
+            user_id=user_id,
+            limit=limit,
+            start_after=start_after,
+            cursor=cursor,
+        ):
+            yield orjson.dumps(message, default=json_default) + b"\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
 @router.get("/{message_id}", response_model=MessageResponse)
-async def get_message(message_id: str):
+async def get_message(
+    message_id: str,
+    loader: MessageLoader = Depends(get_message_loader),
+    quoted_loader: MessageLoader = Depends(get_quoted_message_loader),
+):
     """
     Get a specific message by ID.
     
     - **message_id**: ID of the message to retrieve
     """
     try:
-        message = await FirebaseService.get_message(message_id)
+        message = await loader.load(message_id)
         if not message:
             raise HTTPException(status_code=404, detail="Message not found")
             
         # If there's a quoted message, fetch it
         if message.get("quoted_message_id"):
-            quoted_message = await FirebaseService.get_message(message["quoted_message_id"])
+            quoted_message = await quoted_loader.load(message["quoted_message_id"])
             if quoted_message:
                 message["quoted_message"] = quoted_message
                 
@@ -176,27 +314,39 @@ async def get_message(message_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _timestamp_key(value) -> str:
+    """Get a message timestamp as an ISO string, whether it is a fresh
+    datetime or was already serialized by the cache."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value or ""
+
 class TopicResponse(BaseModel):
-    topic_id: str
+    """A topic with its most recent messages, as returned by the topics list."""
+    id: str
+    user_id: str
     message_count: int
-    last_updated: str
+    last_updated: Optional[datetime] = None
     keywords: List[str] = []
-    messages: List[Dict[str, Any]]
+    messages: List[MessageResponseFlat]
 
-@router.get("/topics/{user_id}", response_model=List[TopicResponse])
-async def get_user_topics(user_id: str):
+@router.get(
+    "/topics/{user_id}",
+    response_model=None,
+    responses={200: {"model": List[TopicResponse]}}
+)
+async def get_user_topics(user_id: str, request: Request):
     """
     Get all topics for a user with their associated messages and metadata.
     
     This endpoint is cached to improve performance. The cache is automatically
-    invalidated when new messages are added to topics.
+    invalidated when new messages are added to topics. Responses carry an
+    **ETag**; sending it back in **If-None-Match** gets a 304 Not Modified
+    with no body while the topics are unchanged.
     
     - **user_id**: ID of the user to get topics for
     """
     try:
-        # Initialize topic service if needed
-        await topic_service.initialize()
-        
         # Get topics with metadata from the topic service (uses caching)
         topics = await topic_service.get_user_topics(user_id=user_id)
         
@@ -217,16 +367,21 @@ async def get_user_topics(user_id: str):
             # Ensure we have the latest message count
             topic["message_count"] = len(messages)
             
-            # Update last_updated from the most recent message if available
-            if messages:
-                topic["last_updated"] = max(
-                    msg.get("timestamp", "") for msg in messages
-                )
+            # last_updated is the newest message's timestamp; the service's
+            # own value is a monotonic clock reading, meaningless to clients
+            topic["last_updated"] = max(
+                (_timestamp_key(msg.get("timestamp")) for msg in messages),
+                default=None
+            )
         
-        # Sort topics by last_updated (newest first)
-        topics.sort(key=lambda x: x.get("last_updated", ""), reverse=True)
+        # Sort topics by last_updated (newest first, empty topics last)
+        topics.sort(key=lambda x: x["last_updated"] or "", reverse=True)
         
-        return topics
+        # Trusted service-layer data: serialized without validation
+        return conditional_response(
+            request,
+            orjson.dumps(topics, default=json_default)
+        )
         
     except Exception as e:
         logger.error(f"Error getting topics: {str(e)}")
@@ -1,10 +1,21 @@
+"""Summary endpoints.
+
+The summary list is built from our own Firestore documents, so it skips
+response-model validation and is serialized directly; its response model
+only documents the payload. The other endpoints keep response_model
+validation.
+"""
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, Response
+from fastapi.responses import ORJSONResponse
+import orjson
 
 from app.services.firebase_service import FirebaseService
 from app.utils.models import SummaryCreate, SummaryResponse
+from app.utils.serialization import json_default
 
-router = APIRouter()
+# orjson serializes the datetimes Firestore returns natively
+router = APIRouter(default_response_class=ORJSONResponse)
 
 
 @router.post("/generate", response_model=SummaryResponse, status_code=201)
@@ -19,35 +30,32 @@ async def generate_summary(summary_data: SummaryCreate):
     """
     try:
         # Add the summary to Firestore
-        summary_id = await FirebaseService.add_summary(
+        created_summary = await FirebaseService.add_summary(
             user_id=summary_data.user_id,
             summary_text=summary_data.summary_text,
             message_ids=summary_data.message_ids,
             metadata=summary_data.metadata,
         )
         
-        # Get the created summary to return
-        created_summary = await FirebaseService.get_summary(summary_id)
-        if not created_summary:
-            raise HTTPException(status_code=500, detail="Failed to create summary")
-            
-        # Get all messages referenced in the summary
-        messages = []
-        for msg_id in summary_data.message_ids:
-            msg = await FirebaseService.get_message(msg_id)
-            if msg:
-                messages.append(msg)
+        # Get all messages referenced in the summary in one batched read
+        lookup = await FirebaseService.get_quoted_messages(
+            summary_data.message_ids
+        )
         
-        return {
-            **created_summary,
-            "messages": messages
-        }
+        created_summary["messages"] = [
+            lookup[m] for m in summary_data.message_ids if m in lookup
+        ]
+        return created_summary
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/", response_model=List[SummaryResponse])
+@router.get(
+    "/",
+    response_model=None,
+    responses={200: {"model": List[SummaryResponse]}}
+)
 async def get_summaries(
     user_id: str,
     limit: int = Query(10, gt=0, le=50, description="Number of summaries to return"),
@@ -64,21 +72,29 @@ async def get_summaries(
             limit=limit,
         )
         
-        # For each summary, fetch its messages
-        result = []
+        # Fetch the messages of every summary in one batched read, then
+        # hand them back out by ID
+        all_ids = {
+            msg_id
+            for summary in summaries
+            for msg_id in summary.get("message_ids", [])
+        }
+        lookup = await FirebaseService.get_quoted_messages(
+            list(all_ids)
+        )
+        
+        # The summaries are fresh dicts from Firestore, so they are filled in
+        # place rather than copied
         for summary in summaries:
-            messages = []
-            for msg_id in summary.get("message_ids", []):
-                msg = await FirebaseService.get_message(msg_id)
-                if msg:
-                    messages.append(msg)
-            
-            result.append({
-                **summary,
-                "messages": messages
-            })
+            summary["messages"] = [
+                lookup[m] for m in summary.get("message_ids", []) if m in lookup
+            ]
         
-        return result
+        # Trusted service-layer data: serialized without validation
+        return Response(
+            content=orjson.dumps(summaries, default=json_default),
+            media_type="application/json"
+        )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -96,17 +112,14 @@ async def get_summary(summary_id: str):
         if not summary:
             raise HTTPException(status_code=404, detail="Summary not found")
             
-        # Get all messages referenced in the summary
-        messages = []
-        for msg_id in summary.get("message_ids", []):
-            msg = await FirebaseService.get_message(msg_id)
-            if msg:
-                messages.append(msg)
+        # Get all messages referenced in the summary in one batched read
+        message_ids = summary.get("message_ids", [])
+        lookup = await FirebaseService.get_quoted_messages(
+            message_ids
+        )
         
-        return {
-            **summary,
-            "messages": messages
-        }
+        summary["messages"] = [lookup[m] for m in message_ids if m in lookup]
+        return summary
         
     except HTTPException:
         raise
@@ -1,9 +1,24 @@
+import asyncio
+import base64
+import binascii
 import logging
-from typing import Dict, Any, Optional, List
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set
 
+import cachetools
+import orjson
 from firebase_admin import firestore
+from google.cloud.firestore_v1.base_document import DocumentSnapshot
+from google.cloud.firestore_v1.field_path import FieldPath
 
-from app.firebase.config import get_firestore_client, SERVER_TIMESTAMP
+from app.firebase.config import get_firestore_client, get_firestore_executor
+from app.firebase.constants import (
+    MESSAGES_COLLECTION,
+    QUOTED_MESSAGE_FIELDS,
+    SUMMARIES_COLLECTION,
+)
+from app.utils.cache import cache_manager
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -11,10 +26,98 @@ logger = logging.getLogger(__name__)
 # Get Firestore client
 db = get_firestore_client()
 
-# Collection names
-MESSAGES_COLLECTION = "messages"
-SUMMARIES_COLLECTION = "summaries"
-USERS_COLLECTION = "users"
+# Maximum number of documents requested per batched read
+BATCH_GET_CHUNK_SIZE = 300
+
+# Maximum number of operations Firestore accepts in one WriteBatch
+BATCH_WRITE_CHUNK_SIZE = 500
+
+
+# Messages are rarely edited once written and the same ones get quoted over
+# and over, so reads are served from a per-process LRU. Updates publish the
+# message ID on this channel so every instance evicts its copy. Entries also
+# expire after MESSAGE_CACHE_TTL seconds, which bounds how long a copy can go
+# stale when an eviction is missed (a read racing an update, or Redis being
+# unavailable for the pub/sub message).
+MESSAGE_CACHE_SIZE = 10_000
+MESSAGE_CACHE_TTL = 60
+MESSAGE_INVALIDATION_CHANNEL = "nova-cache:invalidate:message"
+_message_cache = cachetools.TTLCache(maxsize=MESSAGE_CACHE_SIZE, ttl=MESSAGE_CACHE_TTL)
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any) -> Any:
+    """Run a blocking Firestore SDK call on the shared Firestore thread pool,
+    so it never blocks the event loop.
+    
+    Args:
+        func: The blocking callable
+        *args: Positional arguments for ``func``
+        
+    Returns:
+        Whatever ``func`` returns
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_firestore_executor(), partial(func, *args))
+
+
+def encode_message_cursor(message: Dict[str, Any]) -> str:
+    """Build the opaque pagination cursor pointing just past ``message``.
+    
+    Args:
+        message: The last message of a page, as returned by get_messages
+        
+    Returns:
+        str: URL-safe token for get_messages' ``cursor`` argument
+    """
+    payload = {"t": message["timestamp"].isoformat(), "i": message["id"]}
+    return base64.urlsafe_b64encode(orjson.dumps(payload)).decode("ascii")
+
+
+def decode_message_cursor(cursor: str) -> Dict[str, Any]:
+    """Turn a pagination cursor back into its timestamp and message ID.
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        payload = orjson.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return {
+            "timestamp": datetime.fromisoformat(payload["t"]),
+            "id": payload["i"],
+        }
+    except (binascii.Error, orjson.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def to_quoted_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape a message for display as context (a quote or in a summary).
+    
+    Keeps QUOTED_MESSAGE_FIELDS and the ID, and fills the keys of
+    MessageResponseFlat that the projection leaves out with their defaults,
+    so quotes look the same whether they were projected from Firestore or
+    taken from a full message already on hand.
+    """
+    quoted = {field: message.get(field) for field in QUOTED_MESSAGE_FIELDS}
+    quoted["id"] = message["id"]
+    quoted["metadata"] = {}
+    return quoted
+
+def snapshot_to_dict(doc: DocumentSnapshot) -> Dict[str, Any]:
+    """Turn a document snapshot into a dict carrying its ID.
+    
+    Firestore returns timestamps as DatetimeWithNanoseconds, a datetime
+    subclass that orjson and msgspec refuse to encode, so it is rebuilt as
+    a plain datetime (Firestore stores microseconds, so nothing is lost).
+    """
+    data = doc.to_dict()
+    data["id"] = doc.id
+    timestamp = data.get("timestamp")
+    if isinstance(timestamp, datetime) and type(timestamp) is not datetime:
+        data["timestamp"] = datetime(
+            timestamp.year, timestamp.month, timestamp.day,
+            timestamp.hour, timestamp.minute, timestamp.second,
+            timestamp.microsecond, tzinfo=timestamp.tzinfo
+        )
+    return data
 
 class FirebaseService:
     """Service for handling Firebase Firestore operations."""
@@ -27,7 +130,7 @@ class FirebaseService:
         quoted_message_id: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None,
         topic_id: Optional[str] = None
-    ) -> str:
+    ) -> Dict[str, Any]:
         """Add a new message to Firestore.
         
         Args:
@@ -39,13 +142,15 @@ class FirebaseService:
             topic_id: Optional ID of the topic this message belongs to
             
         Returns:
-            str: The ID of the created message
+            Dict[str, Any]: The created message, including its ID
         """
         message_data = {
             "user_id": user_id,
             "content": content,
             "role": role,
-            "timestamp": SERVER_TIMESTAMP,
+            # Timestamped here rather than with SERVER_TIMESTAMP so the written
+            # message can be returned without reading it back
+            "timestamp": datetime.now(timezone.utc),
             "quoted_message_id": quoted_message_id,
             "metadata": metadata or {},
             "topic_id": topic_id
@@ -53,50 +158,101 @@ class FirebaseService:
         
         try:
             doc_ref = db.collection(MESSAGES_COLLECTION).document()
-            doc_ref.set(message_data)
+            await run_blocking(doc_ref.set, message_data)
             logger.info(f"Message added with ID: {doc_ref.id}")
-            return doc_ref.id
+            # Written already, so the ID can be added without copying
+            message_data["id"] = doc_ref.id
+            return message_data
         except Exception as e:
             logger.error(f"Error adding message: {str(e)}")
             raise
     
+    @staticmethod
+    async def add_messages_bulk(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Add several messages using batched writes.
+        
+        Each chunk of up to 500 messages is committed in a single round trip
+        and is atomic. Chunks are committed in order, so if one fails the
+        earlier chunks stay written and the error is raised; a list of at
+        most BATCH_WRITE_CHUNK_SIZE messages is written all or nothing.
+        
+        Messages are timestamped one microsecond apart in input order, so
+        the import keeps its order when listed by timestamp.
+        
+        Args:
+            messages: Messages to add, each with the keyword arguments of
+                add_message (``user_id`` and ``content`` are required)
+            
+        Returns:
+            List of the created messages, in input order, including their IDs
+        """
+        start = datetime.now(timezone.utc)
+        created = []
+        batches = []
+        for i in range(0, len(messages), BATCH_WRITE_CHUNK_SIZE):
+            batch = db.batch()
+            for offset, message in enumerate(messages[i:i + BATCH_WRITE_CHUNK_SIZE], start=i):
+                message_data = {
+                    "user_id": message["user_id"],
+                    "content": message["content"],
+                    "role": message.get("role", "user"),
+                    "timestamp": start + timedelta(microseconds=offset),
+                    "quoted_message_id": message.get("quoted_message_id"),
+                    "metadata": message.get("metadata") or {},
+                    "topic_id": message.get("topic_id")
+                }
+                doc_ref = db.collection(MESSAGES_COLLECTION).document()
+                batch.set(doc_ref, message_data)
+                created.append({**message_data, "id": doc_ref.id})
+            batches.append(batch)
+        
+        committed = 0
+        try:
+            for batch in batches:
+                await run_blocking(batch.commit)
+                committed += 1
+            logger.info(f"Added {len(created)} messages in {len(batches)} batches")
+            return created
+        except Exception as e:
+            logger.error(
+                f"Error adding messages in bulk after {committed} of "
+                f"{len(batches)} batches were committed: {str(e)}"
+            )
+            raise
+    
     @staticmethod
     async def get_messages(
         user_id: str,
         limit: int = 50,
-        start_after: Optional[str] = None
+        start_after: Optional[str] = None,
+        cursor: Optional[str] = None,
+        topic_id: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """Retrieve messages for a user.
         
         Args:
             user_id: ID of the user to get messages for
             limit: Maximum number of messages to return
-            start_after: Message ID to start after for pagination
+            start_after: Message ID to start after for pagination. Costs an
+                extra read; prefer ``cursor``.
+            cursor: Cursor from encode_message_cursor to start after
+            topic_id: Only return messages assigned to this topic
             
         Returns:
             List of message dictionaries
+            
+        Raises:
+            ValueError: If ``cursor`` is malformed
         """
         try:
-            query = (
-                db.collection(MESSAGES_COLLECTION)
-                .where("user_id", "==", user_id)
-                .order_by("timestamp", direction=firestore.Query.DESCENDING)
-                .limit(limit)
+            query = await FirebaseService._build_messages_query(
+                user_id, limit, start_after, cursor, topic_id
             )
             
-            if start_after:
-                start_doc = db.collection(MESSAGES_COLLECTION).document(start_after).get()
-                if start_doc.exists:
-                    query = query.start_after(start_doc)
-            
             messages = []
-            for doc in query.stream():
-                message = doc.to_dict()
-                message["id"] = doc.id
-                # Convert Firestore timestamp to ISO format
-                if "timestamp" in message and hasattr(message["timestamp"], "isoformat"):
-                    message["timestamp"] = message["timestamp"].isoformat()
-                messages.append(message)
+            # The stream is consumed on the pool; only the snapshots come back
+            for doc in await run_blocking(list, query.stream()):
+                messages.append(snapshot_to_dict(doc))
                 
             return messages
             
@@ -104,27 +260,195 @@ class FirebaseService:
             logger.error(f"Error retrieving messages: {str(e)}")
             raise
     
+    @staticmethod
+    async def stream_messages(
+        user_id: str,
+        limit: int = 50,
+        start_after: Optional[str] = None,
+        cursor: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield a user's messages as Firestore returns them.
+        
+        Takes the same arguments as get_messages, but each message is
+        yielded as soon as its document arrives instead of after the whole
+        page has been read.
+        
+        Raises:
+            ValueError: If ``cursor`` is malformed
+        """
+        query = await FirebaseService._build_messages_query(
+            user_id, limit, start_after, cursor
+        )
+        
+        # The SDK's stream is synchronous, so it is drained on the Firestore
+        # pool and handed to the event loop one document at a time
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        
+        def produce():
+            try:
+                for doc in query.stream():
+                    loop.call_soon_threadsafe(queue.put_nowait, snapshot_to_dict(doc))
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+        
+        producer = loop.run_in_executor(get_firestore_executor(), produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    logger.error(f"Error streaming messages: {str(item)}")
+                    raise item
+                yield item
+        finally:
+            await producer
+    
+    @staticmethod
+    async def _build_messages_query(
+        user_id: str,
+        limit: int,
+        start_after: Optional[str],
+        cursor: Optional[str],
+        topic_id: Optional[str] = None
+    ) -> firestore.Query:
+        """Build the query behind get_messages and stream_messages."""
+        query = db.collection(MESSAGES_COLLECTION).where("user_id", "==", user_id)
+        if topic_id:
+            # Served by the (user_id, topic_id, timestamp) composite index
+            query = query.where("topic_id", "==", topic_id)
+        
+        # The document ID breaks ties between equal timestamps so cursors
+        # are unambiguous
+        query = (
+            query
+            .order_by("timestamp", direction=firestore.Query.DESCENDING)
+            .order_by(FieldPath.document_id(), direction=firestore.Query.DESCENDING)
+            .limit(limit)
+        )
+        
+        if cursor:
+            position = decode_message_cursor(cursor)
+            query = query.start_after({
+                "timestamp": position["timestamp"],
+                FieldPath.document_id(): (
+                    db.collection(MESSAGES_COLLECTION).document(position["id"])
+                ),
+            })
+        elif start_after:
+            start_doc = await run_blocking(
+                db.collection(MESSAGES_COLLECTION).document(start_after).get
+            )
+            if start_doc.exists:
+                query = query.start_after(start_doc)
+        
+        return query
+    
     @staticmethod
     async def get_message(message_id: str) -> Optional[Dict[str, Any]]:
-        """Get a specific message by ID."""
+        """Get a specific message by ID, from the local cache when possible."""
+        cached_message = _message_cache.get(message_id)
+        if cached_message is not None:
+            # Callers attach fields to the result, so never hand out the cached dict
+            return dict(cached_message)
+        
         try:
-            doc = db.collection(MESSAGES_COLLECTION).document(message_id).get()
+            doc = await run_blocking(db.collection(MESSAGES_COLLECTION).document(message_id).get)
             if doc.exists:
-                message = doc.to_dict()
-                message["id"] = doc.id
-                return message
+                message = snapshot_to_dict(doc)
+                _message_cache[message_id] = message
+                return dict(message)
             return None
         except Exception as e:
             logger.error(f"Error getting message {message_id}: {str(e)}")
             raise
     
+    @staticmethod
+    async def get_messages_by_ids(
+        message_ids: List[str],
+        fields: Optional[List[str]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Get several messages in batched reads instead of one read per ID.
+        
+        Args:
+            message_ids: IDs of the messages to fetch; duplicates are ignored
+            fields: Optional projection; only these fields (plus the ID) are
+                read and returned. Projected messages are not cached.
+            
+        Returns:
+            Dict mapping message ID to message for every message that exists
+        """
+        messages = {}
+        unique_ids = []
+        for message_id in dict.fromkeys(message_ids):
+            cached_message = _message_cache.get(message_id)
+            if cached_message is None:
+                unique_ids.append(message_id)
+            elif fields is None:
+                messages[message_id] = dict(cached_message)
+            else:
+                messages[message_id] = {
+                    field: cached_message[field] for field in fields if field in cached_message
+                }
+                messages[message_id]["id"] = message_id
+        
+        try:
+            # Only cache misses are read, in chunks fetched concurrently
+            chunks = await asyncio.gather(*(
+                run_blocking(list, db.get_all(
+                    [
+                        db.collection(MESSAGES_COLLECTION).document(message_id)
+                        for message_id in unique_ids[i:i + BATCH_GET_CHUNK_SIZE]
+                    ],
+                    field_paths=fields
+                ))
+                for i in range(0, len(unique_ids), BATCH_GET_CHUNK_SIZE)
+            ))
+            for docs in chunks:
+                for doc in docs:
+                    if doc.exists:
+                        message = snapshot_to_dict(doc)
+                        if fields is None:
+                            _message_cache[doc.id] = message
+                            message = dict(message)
+                        messages[doc.id] = message
+            return messages
+        except Exception as e:
+            logger.error(f"Error getting messages by IDs: {str(e)}")
+            raise
+    
+    @staticmethod
+    async def get_quoted_messages(message_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get messages for display as context, shaped by to_quoted_message.
+        
+        Only QUOTED_MESSAGE_FIELDS are read.
+        
+        Args:
+            message_ids: IDs of the messages to fetch; duplicates are ignored
+            
+        Returns:
+            Dict mapping message ID to message for every message that exists
+        """
+        messages = await FirebaseService.get_messages_by_ids(
+            message_ids,
+            fields=QUOTED_MESSAGE_FIELDS
+        )
+        return {
+            message_id: to_quoted_message(message)
+            for message_id, message in messages.items()
+        }
+    
     @staticmethod
     async def add_summary(
         user_id: str,
         summary_text: str,
         message_ids: List[str],
         metadata: Optional[Dict[str, Any]] = None
-    ) -> str:
+    ) -> Dict[str, Any]:
         """Add a new summary to Firestore.
         
         Args:
@@ -134,21 +458,22 @@ class FirebaseService:
             metadata: Additional metadata
             
         Returns:
-            str: The ID of the created summary
+            Dict[str, Any]: The created summary, including its ID
         """
         summary_data = {
             "user_id": user_id,
             "summary_text": summary_text,
             "message_ids": message_ids,
-            "timestamp": SERVER_TIMESTAMP,
+            "timestamp": datetime.now(timezone.utc),
             "metadata": metadata or {}
         }
         
         try:
             doc_ref = db.collection(SUMMARIES_COLLECTION).document()
-            doc_ref.set(summary_data)
+            await run_blocking(doc_ref.set, summary_data)
             logger.info(f"Summary added with ID: {doc_ref.id}")
-            return doc_ref.id
+            summary_data["id"] = doc_ref.id
+            return summary_data
         except Exception as e:
             logger.error(f"Error adding summary: {str(e)}")
             raise
@@ -169,7 +494,7 @@ class FirebaseService:
         """
         try:
             doc_ref = db.collection(MESSAGES_COLLECTION).document(message_id)
-            doc = doc_ref.get()
+            doc = await run_blocking(doc_ref.get)
             
             if not doc.exists:
                 logger.warning(f"Message {message_id} not found for update")
@@ -186,7 +511,9 @@ class FirebaseService:
                 logger.warning("No valid fields to update")
                 return False
                 
-            doc_ref.update(update_data)
+            await run_blocking(doc_ref.update, update_data)
+            FirebaseService.evict_cached_message(message_id)
+            await cache_manager.publish(MESSAGE_INVALIDATION_CHANNEL, message_id)
             logger.info(f"Updated message {message_id} with fields: {list(update_data.keys())}")
             return True
             
@@ -194,6 +521,51 @@ class FirebaseService:
             logger.error(f"Error updating message {message_id}: {str(e)}")
             return False
     
+    @staticmethod
+    async def set_message_topic(message_id: str, topic_id: str) -> bool:
+        """Assign a message to a topic.
+        
+        The existence check and the write run in one transaction, and cached
+        copies of the message are evicted on every instance only after it
+        commits, so no instance keeps serving the message without its topic.
+        
+        Args:
+            message_id: ID of the message to update
+            topic_id: ID of the topic to assign
+            
+        Returns:
+            bool: True if the message was updated, False if it doesn't exist
+        """
+        doc_ref = db.collection(MESSAGES_COLLECTION).document(message_id)
+        
+        @firestore.transactional
+        def assign_topic(transaction) -> bool:
+            snapshot = doc_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return False
+            transaction.update(doc_ref, {"topic_id": topic_id})
+            return True
+        
+        try:
+            updated = await run_blocking(assign_topic, db.transaction())
+        except Exception as e:
+            logger.error(f"Error setting topic for message {message_id}: {str(e)}")
+            raise
+        
+        if not updated:
+            logger.warning(f"Message {message_id} not found for topic assignment")
+            return False
+        
+        FirebaseService.evict_cached_message(message_id)
+        await cache_manager.publish(MESSAGE_INVALIDATION_CHANNEL, message_id)
+        logger.info(f"Assigned topic {topic_id} to message {message_id}")
+        return True
+    
+    @staticmethod
+    def evict_cached_message(message_id: str) -> None:
+        """Drop a message from this process's message cache."""
+        _message_cache.pop(message_id, None)
+    
     @staticmethod
     async def get_summaries(user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Get summaries for a user."""
@@ -206,15 +578,99 @@ class FirebaseService:
             )
             
             summaries = []
-            for doc in query.stream():
-                summary = doc.to_dict()
-                summary["id"] = doc.id
-                if "timestamp" in summary and hasattr(summary["timestamp"], "isoformat"):
-                    summary["timestamp"] = summary["timestamp"].isoformat()
-                summaries.append(summary)
+            for doc in await run_blocking(list, query.stream()):
+                summaries.append(snapshot_to_dict(doc))
                 
             return summaries
             
         except Exception as e:
             logger.error(f"Error retrieving summaries: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    @staticmethod
+    async def get_summary(summary_id: str) -> Optional[Dict[str, Any]]:
+        """Get a specific summary by ID."""
+        try:
+            doc = await run_blocking(db.collection(SUMMARIES_COLLECTION).document(summary_id).get)
+            if doc.exists:
+                return snapshot_to_dict(doc)
+            return None
+        except Exception as e:
+            logger.error(f"Error getting summary {summary_id}: {str(e)}")
+            raise
+
+
+class MessageLoader:
+    """Request-scoped loader that batches and memoizes message reads.
+    
+    Loads issued in the same event loop tick are fetched with one
+    get_messages_by_ids call, and every load of an ID within the request
+    shares that single read. Create one per request.
+    """
+    
+    def __init__(self, fields: Optional[List[str]] = None):
+        """Create a loader.
+        
+        Args:
+            fields: Optional projection passed to get_messages_by_ids
+        """
+        self.fields = fields
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._queue: List[str] = []
+        # Strong references to in-flight batch reads, so they aren't
+        # garbage collected before they finish
+        self._background_tasks: Set[asyncio.Task] = set()
+    
+    async def load(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Get a message by ID, batched with other loads in the same tick.
+        
+        Args:
+            message_id: ID of the message to load
+            
+        Returns:
+            A copy of the message, or None if it doesn't exist
+        """
+        future = self._futures.get(message_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._futures[message_id] = future
+            if not self._queue:
+                loop.call_soon(self._dispatch)
+            self._queue.append(message_id)
+        
+        # Shielded: the future is shared by every load of this ID, so one
+        # cancelled caller must not cancel it for the others
+        message = await asyncio.shield(future)
+        # Callers attach fields to the result, so each gets its own copy
+        return dict(message) if message is not None else None
+    
+    async def load_many(self, message_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Get several messages by ID, in order, in a single batch."""
+        return await asyncio.gather(*(self.load(message_id) for message_id in message_ids))
+    
+    def _dispatch(self) -> None:
+        """Fetch every ID queued during the current tick."""
+        message_ids, self._queue = self._queue, []
+        task = asyncio.ensure_future(self._resolve(message_ids))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    async def _resolve(self, message_ids: List[str]) -> None:
+        """Read a batch and settle the futures waiting on it."""
+        try:
+            messages = await FirebaseService.get_messages_by_ids(message_ids, fields=self.fields)
+        except Exception as e:
+            for message_id in message_ids:
+                # Failed loads are forgotten so a later load can retry
+                future = self._futures.pop(message_id)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for message_id in message_ids:
+            future = self._futures[message_id]
+            if future.cancelled():
+                self._futures.pop(message_id)
+            elif not future.done():
+                future.set_result(messages.get(message_id))
@@ -3,26 +3,64 @@ Topic analysis service for identifying and managing conversation topics.
 Uses cosine similarity to group related messages into topics.
 """
 import logging
-from typing import Dict, List, Optional, Tuple, Any
+import os
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.cluster import DBSCAN
+from scipy import sparse
 
 from app.services.firebase_service import FirebaseService
-from app.utils.cache import cached, cache_manager
+from app.utils.cache import LRUCache, cached, cache_manager, cached_key
 
 logger = logging.getLogger(__name__)
 
+# Number of hashed feature columns; large enough that collisions are rare
+# even with bigrams
+VECTOR_FEATURES = 2 ** 17
+
+# Number of keywords kept per topic
+TOPIC_KEYWORDS = 5
+
+# Number of newest message IDs kept in each topic's Redis index
+TOPIC_MESSAGE_INDEX_SIZE = 200
+
+# Number of message-to-topic assignments remembered in memory
+MESSAGE_TOPIC_CACHE_SIZE = 100_000
+
+# Batch re-clustering: run after this many assignments per user, over the
+# user's most recent messages, with these DBSCAN parameters
+RECLUSTER_EVERY = 200
+RECLUSTER_WINDOW = 500
+DBSCAN_EPS = 0.7
+DBSCAN_MIN_SAMPLES = 3
+
 class TopicService:
     """Service for managing conversation topics using cosine similarity."""
     
     def __init__(self):
-        self.vectorizer = TfidfVectorizer(stop_words='english', max_features=1000)
-        self.executor = ThreadPoolExecutor(max_workers=4)
+        # scikit-learn is imported on first use, so workers that never
+        # analyze topics don't load it
+        self._vectorizer = None
+        self._analyzer = None
+        # Caps concurrent vectorization at one call per core so bursts of
+        # messages can't oversubscribe the CPU
+        self._cpu_sem = asyncio.Semaphore(os.cpu_count() or 1)
         self.topics = {}  # In-memory store for topic metadata
+        # Reverse indexes: each user's topic IDs, and the topic of recently
+        # assigned messages
+        self._by_user: Dict[str, List[str]] = defaultdict(list)
+        self._msg_to_topic = LRUCache(maxsize=MESSAGE_TOPIC_CACHE_SIZE)
+        # Per user: running sum of message vectors for each topic, and the
+        # normalized centroids stacked into one CSR matrix with their topic IDs
+        self._topic_sums: Dict[str, Dict[str, sparse.csr_matrix]] = {}
+        self._centroids: Dict[str, Tuple[List[str], sparse.csr_matrix]] = {}
+        # Assignments per user since their last recluster, and the running
+        # recluster tasks (referenced so they aren't garbage collected)
+        self._assigned_since_recluster: Dict[str, int] = defaultdict(int)
+        self._background_tasks = set()
         self._initialized = False
         logger.info("TopicService initialized")
 
@@ -31,12 +69,39 @@ class TopicService:
         if not self._initialized:
             # Load existing topics from cache or database
             await self._load_topics()
+            # Run the vectorize-and-score path once so the first real message
+            # doesn't pay for lazy setup (the scikit-learn import, stop-word
+            # set, regex, sparse code paths)
+            await self._run_cpu(self._warm_up)
             self._initialized = True
     
+    @property
+    def vectorizer(self):
+        """The shared hashing vectorizer, built on first use.
+        
+        Stateless and vocabulary-free: nothing is refit per message, there is
+        no fitted vocabulary to hold in memory, and rows come out
+        L2-normalized. float32 halves the memory of every vector and
+        centroid at no cost to similarity ranking.
+        """
+        if self._vectorizer is None:
+            from sklearn.feature_extraction.text import HashingVectorizer
+            
+            self._vectorizer = HashingVectorizer(
+                n_features=VECTOR_FEATURES,
+                alternate_sign=False,
+                norm='l2',
+                stop_words='english',
+                ngram_range=(1, 2),
+                dtype=np.float32
+            )
+        return self._vectorizer
+    
     async def _load_topics(self):
         """Load topics from cache or database."""
         # This is a placeholder. In a real app, you'd load topics from a persistent store.
         self.topics = {}
+        self._by_user.clear()
     
     @cached(key_prefix="topic_analysis", namespace="topics")
     async def analyze_message_topic(
@@ -59,50 +124,264 @@ class TopicService:
             str: ID of the assigned topic, or None if no match
         """
         try:
-            # Get recent messages for context
-            recent_messages = await self._get_recent_messages(user_id)
-            
-            if not recent_messages:
-                return None
-                
-            # Prepare texts for analysis
-            texts = [msg["content"] for msg in recent_messages]
-            texts.append(content)  # Add current message
-            
-            # Run vectorization and similarity analysis in thread pool
-            loop = asyncio.get_running_loop()
-            topic_id = await loop.run_in_executor(
-                self.executor,
+            # Build the user's topic centroids from recent messages once
+            await self._ensure_centroids(user_id)
+            
+            # Run vectorization and similarity analysis off the event loop
+            topic_id, vector = await self._run_cpu(
                 self._find_similar_topic,
-                texts,
+                user_id,
+                content,
                 threshold
             )
             
             # If no similar topic found, create a new one
             if not topic_id:
-                topic_id = f"topic_{user_id}_{len(self.topics) + 1}"
+                topic_id = self._next_topic_id(user_id)
                 self.topics[topic_id] = {
                     "keywords": self._extract_keywords(content),
                     "message_count": 0,
-                    "last_updated": asyncio.get_event_loop().time(),
+                    "last_updated": time.monotonic(),
                     "user_id": user_id
                 }
+                self._by_user[user_id].append(topic_id)
+            
+            self._add_to_centroid(user_id, topic_id, vector)
             
             # Update message with topic ID
             await self._update_message_topic(message_id, topic_id)
             
             # Update topic metadata
-            await self._update_topic_metadata(topic_id)
+            self._update_topic_metadata(topic_id)
             
             # Invalidate related caches
             await self._invalidate_topic_caches(user_id, topic_id)
             
+            self._schedule_recluster(user_id)
+            
             return topic_id
             
         except Exception as e:
             logger.error(f"Error analyzing message topic: {str(e)}")
             return None
     
+    async def _run_cpu(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run CPU-bound vector work in a thread, bounded by the core count.
+        
+        numpy and scipy release the GIL inside their kernels, so these calls
+        run in parallel with each other and with the event loop.
+        """
+        async with self._cpu_sem:
+            return await asyncio.to_thread(func, *args)
+    
+    def _warm_up(self):
+        """Vectorize and score a sample text, discarding the result."""
+        vector = self.vectorizer.transform(["warm up the topic vectorizer"])
+        vector.dot(vector.T).toarray()
+    
+    def _find_similar_topic(
+        self,
+        user_id: str,
+        content: str,
+        threshold: float
+    ) -> Tuple[Optional[str], sparse.csr_matrix]:
+        """Match a message against the user's topic centroids.
+        
+        Args:
+            user_id: ID of the user whose topics to search
+            content: Text content of the message
+            threshold: Minimum cosine similarity for a match
+            
+        Returns:
+            The best matching topic ID (None if nothing reaches the threshold)
+            and the message vector
+        """
+        vector = self.vectorizer.transform([content])
+        if user_id not in self._centroids:
+            return None, vector
+        
+        topic_ids, centroids = self._centroids[user_id]
+        # Both sides are unit-norm, so cosine similarity is a plain sparse dot
+        # product; one matmul scores every topic
+        scores = centroids.dot(vector.T).toarray().ravel()
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None, vector
+        return topic_ids[best], vector
+    
+    def _add_to_centroid(self, user_id: str, topic_id: str, vector: sparse.csr_matrix):
+        """Fold a message vector into its topic's centroid."""
+        sums = self._topic_sums.setdefault(user_id, {})
+        sums[topic_id] = sums[topic_id] + vector if topic_id in sums else vector
+        self._rebuild_centroids(user_id)
+    
+    def _rebuild_centroids(self, user_id: str):
+        """Restack a user's normalized centroids into one CSR matrix."""
+        sums = self._topic_sums.get(user_id)
+        if not sums:
+            self._centroids.pop(user_id, None)
+            return
+        stacked = sparse.vstack(list(sums.values()), format='csr')
+        norms = np.sqrt(np.asarray(stacked.multiply(stacked).sum(axis=1)).ravel())
+        scale = (1.0 / np.maximum(norms, 1e-12)).astype(np.float32)
+        # Normalized once here instead of on every comparison
+        self._centroids[user_id] = (
+            list(sums),
+            sparse.diags(scale).dot(stacked).tocsr()
+        )
+    
+    async def _ensure_centroids(self, user_id: str):
+        """Seed a user's topic centroids from their recent messages.
+        
+        Only runs the first time a user is seen by this process; afterwards
+        centroids are updated incrementally as messages are assigned, and
+        rebuilt periodically by recluster.
+        """
+        if user_id in self._topic_sums:
+            return
+        
+        recent_messages = await self._get_recent_messages(user_id)
+        by_topic = defaultdict(list)
+        for msg in recent_messages:
+            if msg.get("topic_id"):
+                by_topic[msg["topic_id"]].append(msg["content"])
+                self._msg_to_topic.set(msg["id"], msg["topic_id"])
+        
+        sums = {}
+        if by_topic:
+            for topic_id, texts in by_topic.items():
+                vectors = await self._run_cpu(self.vectorizer.transform, texts)
+                sums[topic_id] = sparse.csr_matrix(vectors.sum(axis=0))
+                self._register_topic(user_id, topic_id, texts)
+        
+        self._topic_sums[user_id] = sums
+        self._rebuild_centroids(user_id)
+    
+    @staticmethod
+    def _next_topic_id(user_id: str) -> str:
+        """Make a new topic ID for a user.
+        
+        The suffix is random rather than a counter, so IDs stay unique across
+        restarts and across worker processes, which share topics only through
+        the topic IDs stored on messages.
+        """
+        return f"topic_{user_id}_{uuid.uuid4().hex}"
+    
+    def _register_topic(self, user_id: str, topic_id: str, texts: List[str]):
+        """Add a topic seen only through its messages to the in-memory store.
+        
+        Topics from before this process started, or created by another
+        instance, are known only through the topic IDs on their messages.
+        """
+        if topic_id in self.topics:
+            return
+        self.topics[topic_id] = {
+            "keywords": self._extract_keywords(" ".join(texts)),
+            "message_count": len(texts),
+            "last_updated": time.monotonic(),
+            "user_id": user_id
+        }
+        self._by_user[user_id].append(topic_id)
+    
+    def _schedule_recluster(self, user_id: str):
+        """Start a background recluster once enough messages have been assigned."""
+        self._assigned_since_recluster[user_id] += 1
+        if self._assigned_since_recluster[user_id] < RECLUSTER_EVERY:
+            return
+        self._assigned_since_recluster[user_id] = 0
+        task = asyncio.create_task(self.recluster(user_id))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    async def recluster(self, user_id: str, window: int = RECLUSTER_WINDOW):
+        """Rebuild a user's topic centroids by clustering their recent messages.
+        
+        Online assignment folds every message into a running centroid, so
+        centroids drift with old messages and near-duplicate topics never
+        merge. This runs DBSCAN over the last ``window`` messages and rebuilds
+        the centroid of each topic found there from its topic's clusters;
+        other topics are left as they are. A cluster is credited to the
+        topic most of its messages carry; noise messages stay with their own
+        topic. A topic left with no messages loses its centroid, so new
+        messages go to the topic it merged into. Stored message assignments
+        are not rewritten.
+        
+        Args:
+            user_id: ID of the user whose topics to recluster
+            window: Number of recent messages to cluster
+        """
+        try:
+            messages = [
+                msg for msg in await FirebaseService.get_messages(user_id=user_id, limit=window)
+                if msg.get("role") == "user" and msg.get("topic_id")
+            ]
+            if len(messages) < DBSCAN_MIN_SAMPLES:
+                return
+            
+            vectors, labels = await self._run_cpu(
+                self._cluster,
+                [msg["content"] for msg in messages]
+            )
+            
+            clusters = defaultdict(list)
+            for i, label in enumerate(labels):
+                clusters[label].append(i)
+            
+            rows = defaultdict(list)
+            for label, indices in clusters.items():
+                if label < 0:
+                    for i in indices:
+                        rows[messages[i]["topic_id"]].append(i)
+                else:
+                    votes = Counter(messages[i]["topic_id"] for i in indices)
+                    rows[votes.most_common(1)[0][0]].extend(indices)
+            
+            sums = {}
+            for topic_id, indices in rows.items():
+                sums[topic_id] = sparse.csr_matrix(vectors[indices].sum(axis=0))
+                self._register_topic(
+                    user_id,
+                    topic_id,
+                    [messages[i]["content"] for i in indices]
+                )
+            
+            # Only topics seen in the window change: merged-away topics lose
+            # their centroid and the rest get the recomputed one. Topics
+            # outside the window, and topics created by assignments that ran
+            # while this was awaiting, keep theirs. Nothing is awaited between
+            # the merge and the rebuild, so assignments on the event loop
+            # can't interleave with them.
+            topic_sums = self._topic_sums.setdefault(user_id, {})
+            for topic_id in {msg["topic_id"] for msg in messages} - sums.keys():
+                topic_sums.pop(topic_id, None)
+            topic_sums.update(sums)
+            self._rebuild_centroids(user_id)
+            logger.info(
+                f"Reclustered {len(messages)} messages for user {user_id} "
+                f"into {len(sums)} topic centroids"
+            )
+            
+        except Exception as e:
+            logger.error(f"Error reclustering topics for user {user_id}: {str(e)}")
+    
+    def _cluster(self, texts: List[str]) -> Tuple[sparse.csr_matrix, np.ndarray]:
+        """Vectorize texts and label them with DBSCAN clusters (-1 for noise)."""
+        from sklearn.cluster import DBSCAN
+        
+        vectors = self.vectorizer.transform(texts)
+        labels = DBSCAN(
+            eps=DBSCAN_EPS,
+            min_samples=DBSCAN_MIN_SAMPLES,
+            metric='cosine'
+        ).fit_predict(vectors)
+        return vectors, labels
+    
+    def _extract_keywords(self, content: str, top_n: int = TOPIC_KEYWORDS) -> List[str]:
+        """Get the most frequent non-stop-word terms of a text."""
+        if self._analyzer is None:
+            self._analyzer = self.vectorizer.build_analyzer()
+        return [term for term, _ in Counter(self._analyzer(content)).most_common(top_n)]
+    
     async def _get_recent_messages(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
         """Get recent messages for a user with caching."""
         cache_key = cache_manager.get_cache_key("recent_messages", user_id=user_id, limit=limit)
@@ -120,9 +399,9 @@ class TopicService:
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                await FirebaseService.update_message(
+                await FirebaseService.set_message_topic(
                     message_id=message_id,
-                    update_data={"topic_id": topic_id}
+                    topic_id=topic_id
                 )
                 break
             except Exception as e:
@@ -130,29 +409,45 @@ class TopicService:
                     logger.error(f"Failed to update message topic after {max_retries} attempts: {str(e)}")
                     raise
                 await asyncio.sleep(0.1 * (attempt + 1))  # Exponential backoff
+        
+        self._msg_to_topic.set(message_id, topic_id)
+        
+        # Index the message under its topic so get_topic_messages can read
+        # IDs from Redis instead of querying Firestore. Topics without an
+        # index yet get one built on their first read.
+        await cache_manager.list_push(
+            self._topic_index_key(topic_id),
+            [message_id],
+            TOPIC_MESSAGE_INDEX_SIZE
+        )
     
-    async def _update_topic_metadata(self, topic_id: str):
-        """Update topic metadata in memory and cache."""
+    @staticmethod
+    def _topic_index_key(topic_id: str) -> str:
+        """Cache key of the Redis list holding a topic's message IDs."""
+        return cache_manager.get_cache_key("topic_msgs", topic_id=topic_id)
+    
+    def _update_topic_metadata(self, topic_id: str):
+        """Update topic metadata in memory.
+        
+        The cached copy is not rewritten here; _invalidate_topic_caches drops
+        it and the next get_topic caches the new metadata.
+        """
         if topic_id in self.topics:
             self.topics[topic_id]["message_count"] += 1
-            self.topics[topic_id]["last_updated"] = asyncio.get_event_loop().time()
-            
-            # Update topic in cache
-            cache_key = cache_manager.get_cache_key("topic", topic_id=topic_id)
-            await cache_manager.set(cache_key, self.topics[topic_id])
+            self.topics[topic_id]["last_updated"] = time.monotonic()
     
     async def _invalidate_topic_caches(self, user_id: str, topic_id: str):
         """Invalidate caches related to topics."""
-        # Invalidate user topics cache
-        user_topics_key = cache_manager.get_cache_key("user_topics", user_id=user_id)
-        await cache_manager.delete(user_topics_key)
-        
-        # Invalidate specific topic cache
-        topic_key = cache_manager.get_cache_key("topic", topic_id=topic_id)
-        await cache_manager.delete(topic_key)
-        
-        # Invalidate any list caches that might include this topic
-        await cache_manager.invalidate_by_prefix(f"topics:{user_id}")
+        # The user's topic list and the topic itself go in one UNLINK, while
+        # list caches that might include this topic are dropped by tag. The
+        # keys are built the way @cached builds them, namespace included.
+        await asyncio.gather(
+            cache_manager.delete_many(
+                cached_key("topics", "user_topics", user_id=user_id),
+                cached_key("topics", "topic", topic_id=topic_id)
+            ),
+            cache_manager.invalidate_by_prefix(f"topics:{user_id}")
+        )
 
     @cached(key_prefix="topic", namespace="topics")
     async def get_topic(self, topic_id: str) -> Optional[Dict]:
@@ -165,23 +460,24 @@ class TopicService:
         Returns:
             Dict containing topic metadata or None if not found
         """
-        # This will only be called if not in cache
-        topic = self.topics.get(topic_id)
-        if topic:
-            await cache_manager.set(
-                cache_manager.get_cache_key("topic", topic_id=topic_id),
-                topic
-            )
-        return topic
+        # This will only be called if not in cache; the decorator stores the result
+        return self.topics.get(topic_id)
 
     async def get_message_topic(self, message_id: str) -> Optional[Dict]:
         """Get topic for a specific message."""
-        topic_id = self._document_topics.get(message_id)
+        topic_id = self._msg_to_topic.get(message_id)
+        if topic_id is None:
+            # Assigned by another instance or forgotten: read it off the message
+            message = await FirebaseService.get_message(message_id)
+            topic_id = message.get("topic_id") if message else None
+            if topic_id:
+                self._msg_to_topic.set(message_id, topic_id)
         if topic_id:
-            return await self.get_topic(topic_id)
+            # By keyword, so the cache key includes the topic ID
+            return await self.get_topic(topic_id=topic_id)
         return None
 
-    @cached(key_prefix="user_topics", namespace="topics")
+    @cached(key_prefix="user_topics", namespace="topics", tag_by="user_id")
     async def get_user_topics(self, user_id: str) -> List[Dict]:
         """
         Get all topics for a user with caching.
@@ -194,9 +490,8 @@ class TopicService:
         """
         # This will only be called if not in cache
         user_topics = [
-            {"id": tid, **data} 
-            for tid, data in self.topics.items() 
-            if data.get("user_id") == user_id
+            {"id": tid, **self.topics[tid]}
+            for tid in self._by_user.get(user_id, ())
         ]
         
         # Sort by last_updated (newest first)
@@ -225,15 +520,35 @@ class TopicService:
         if cached_messages is not None:
             return cached_messages
             
-        # Get all user messages and filter by topic
-        all_messages = await FirebaseService.get_messages(user_id=user_id, limit=1000)
-        topic_messages = [
-            msg for msg in all_messages 
-            if msg.get("topic_id") == topic_id
-        ][:limit]
+        topic_messages = []
+        index_key = self._topic_index_key(topic_id)
+        if limit <= TOPIC_MESSAGE_INDEX_SIZE:
+            # Newest IDs from the topic index, then the bodies in one batched read
+            message_ids = await cache_manager.list_tail(index_key, limit)
+            lookup = await FirebaseService.get_messages_by_ids(message_ids)
+            topic_messages = [
+                lookup[m] for m in message_ids
+                if m in lookup and lookup[m].get("topic_id") == topic_id
+            ]
+        
+        if not topic_messages:
+            # Index missing (evicted, or the topic predates it): query the
+            # topic directly and rebuild the whole index from the result
+            topic_messages = await FirebaseService.get_messages(
+                user_id=user_id,
+                limit=max(limit, TOPIC_MESSAGE_INDEX_SIZE),
+                topic_id=topic_id
+            )
+            await cache_manager.list_push(
+                index_key,
+                [msg["id"] for msg in reversed(topic_messages)],
+                TOPIC_MESSAGE_INDEX_SIZE,
+                replace=True
+            )
+            topic_messages = topic_messages[:limit]
         
-        # Cache the result
-        await cache_manager.set(cache_key, topic_messages)
+        # Cache the result, tagged so topic changes for the user invalidate it
+        await cache_manager.set(cache_key, topic_messages, tags=[f"topics:{user_id}"])
         
         return topic_messages
 
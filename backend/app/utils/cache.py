@@ -1,22 +1,90 @@
 """
 Cache utilities for the application using Redis.
 """
-import json
-from typing import Any, Optional, TypeVar, Type, Callable, Awaitable
-from functools import wraps
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple, TypeVar, Type, Callable, Awaitable
+from functools import lru_cache, wraps
 import logging
 from fastapi import Request, Response
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
 from fastapi_cache.decorator import cache
 from redis import asyncio as aioredis
+import cachetools
+import orjson
+import xxhash
 
 from app.utils.config import settings
+from app.utils.serialization import json_default
 
 logger = logging.getLogger(__name__)
 
 T = TypeVar('T')
 
+# Redis set holding every key stored under a tag
+TAG_KEY_PREFIX = "tag:"
+
+# Keys per SCAN step and per UNLINK when invalidating by pattern
+SCAN_BATCH_SIZE = 500
+
+# Distinct cache keys whose construction is memoized
+CACHE_KEY_MEMO_SIZE = 4096
+
+# In-process copy of hot Redis values: entry count and seconds kept. The TTL
+# bounds how long another instance's writes can go unseen.
+L1_CACHE_SIZE = 10_000
+L1_CACHE_TTL = 30
+
+@lru_cache(maxsize=CACHE_KEY_MEMO_SIZE)
+def _build_cache_key(prefix: str, items: Tuple[Tuple[str, Any], ...]) -> str:
+    """Build a cache key from a prefix and sorted keyword items.
+    
+    The items are hashed into a fixed 16-character suffix so keys stay short
+    however many arguments they carry; the prefix is kept readable. In debug
+    mode the items are spelled out instead.
+    """
+    params = ":".join(f"{k}:{v}" for k, v in items)
+    if settings.debug:
+        return f"{prefix}:{params}"
+    return f"{prefix}:{xxhash.xxh3_64_hexdigest(params.encode())}"
+
+class LRUCache:
+    """Process-local least-recently-used cache.
+    
+    Not thread-safe; it is meant to be used from the event loop only.
+    """
+    
+    def __init__(self, maxsize: int = 10_000):
+        self.maxsize = maxsize
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a value, marking it as recently used."""
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+    
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used one when full."""
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def pop(self, key: Hashable) -> None:
+        """Drop a value if it is cached."""
+        self._data.pop(key, None)
+    
+    def clear(self) -> None:
+        """Drop every value."""
+        self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
 class CacheManager:
     """Manages cache operations for the application."""
     
@@ -32,17 +100,19 @@ class CacheManager:
         if not self._initialized:
             self.backend = None
             self.initialized = False
+            self._listeners: Dict[str, asyncio.Task] = {}
+            # Holds the serialized bytes, so every hit decodes a fresh copy
+            # that callers are free to mutate
+            self._l1 = cachetools.TTLCache(maxsize=L1_CACHE_SIZE, ttl=L1_CACHE_TTL)
+            self._l1_lock = threading.Lock()
             self._initialized = True
     
     async def initialize(self):
         """Initialize the Redis cache backend."""
         if not self.initialized and settings.cache_enabled:
             try:
-                redis = aioredis.from_url(
-                    settings.redis_url,
-                    encoding="utf8",
-                    decode_responses=True
-                )
+                # Payloads are orjson bytes, so responses are left undecoded
+                redis = aioredis.from_url(settings.redis_url)
                 self.backend = RedisBackend(redis)
                 FastAPICache.init(self.backend, prefix="nova-cache")
                 self.initialized = True
@@ -57,33 +127,73 @@ class CacheManager:
             return prefix
         
         # Sort keys for consistent key generation
-        sorted_kwargs = sorted(kwargs.items())
-        key_parts = [f"{k}:{v}" for k, v in sorted_kwargs]
-        return f"{prefix}:{":".join(key_parts)}"
+        items = tuple(sorted(kwargs.items()))
+        try:
+            hash(items)
+        except TypeError:
+            # Unhashable values (lists, dicts) can't be memoized
+            return _build_cache_key.__wrapped__(prefix, items)
+        return _build_cache_key(prefix, items)
     
     async def get(self, key: str) -> Optional[Any]:
-        """Get a value from the cache."""
+        """Get a value from the cache, trying the in-process copy first."""
         if not self.initialized or not settings.cache_enabled:
             return None
             
         try:
+            with self._l1_lock:
+                value = self._l1.get(key)
+            if value is not None:
+                return orjson.loads(value)
+            
             value = await self.backend.get(key)
             if value is not None:
                 logger.debug(f"Cache hit for key: {key}")
-                return json.loads(value)
+                with self._l1_lock:
+                    self._l1[key] = value
+                return orjson.loads(value)
             return None
         except Exception as e:
             logger.error(f"Error getting from cache: {str(e)}")
             return None
     
-    async def set(self, key: str, value: Any, expire: Optional[int] = None) -> bool:
-        """Set a value in the cache."""
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        expire: Optional[int] = None,
+        tags: Optional[Iterable[str]] = None
+    ) -> bool:
+        """Set a value in the cache.
+        
+        Args:
+            key: Cache key
+            value: Value orjson can serialize; datetimes, including subclasses
+                such as Firestore's, are stored as ISO strings and naive ones
+                are taken as UTC
+            expire: Time to live in seconds (defaults to CACHE_TTL from settings)
+            tags: Tags to file the key under, for invalidate_by_prefix
+        """
         if not self.initialized or not settings.cache_enabled:
             return False
             
+        try:
+            payload = orjson.dumps(value, default=json_default, option=orjson.OPT_NAIVE_UTC)
+        except TypeError as e:
+            logger.warning(f"Not caching {key}, value is not serializable: {str(e)}")
+            return False
+        
         try:
             expire = expire or settings.cache_ttl
-            await self.backend.set(key, json.dumps(value), expire=expire)
+            with self._l1_lock:
+                self._l1[key] = payload
+            async with self.backend.redis.pipeline(transaction=False) as pipe:
+                pipe.set(key, payload, ex=expire)
+                for tag in tags or ():
+                    # The tag set expires along with its newest key
+                    pipe.sadd(f"{TAG_KEY_PREFIX}{tag}", key)
+                    pipe.expire(f"{TAG_KEY_PREFIX}{tag}", expire)
+                await pipe.execute()
             logger.debug(f"Cache set for key: {key} (expires in {expire}s)")
             return True
         except Exception as e:
@@ -95,39 +205,209 @@ class CacheManager:
         if not self.initialized or not settings.cache_enabled:
             return False
             
+        self._l1_discard([key])
         try:
-            await self.backend.clear(key)
+            # Not backend.clear(), which treats its argument as a namespace
+            # and runs KEYS over the whole keyspace
+            await self.backend.redis.unlink(key)
             logger.debug(f"Cache deleted for key: {key}")
             return True
         except Exception as e:
             logger.error(f"Error deleting from cache: {str(e)}")
             return False
     
-    async def invalidate_by_prefix(self, prefix: str) -> int:
-        """Invalidate all cache keys with the given prefix."""
-        if not self.initialized or not settings.cache_enabled:
+    async def delete_many(self, *keys: str) -> int:
+        """Delete several values from the cache with a single UNLINK."""
+        if not keys or not self.initialized or not settings.cache_enabled:
             return 0
             
+        self._l1_discard(keys)
         try:
-            # This is a simple implementation that works with Redis
-            # For production, consider using SCAN for large datasets
-            keys = await self.backend.redis.keys(f"*{prefix}*")
-            if keys:
-                await self.backend.redis.delete(*keys)
-                logger.info(f"Invalidated {len(keys)} cache keys with prefix: {prefix}")
-                return len(keys)
+            count = await self.backend.redis.unlink(*keys)
+            logger.debug(f"Cache deleted for keys: {', '.join(keys)}")
+            return count
+        except Exception as e:
+            logger.error(f"Error deleting from cache: {str(e)}")
+            return 0
+    
+    async def invalidate_by_prefix(self, prefix: str, scan: bool = False) -> int:
+        """Invalidate all cache keys stored under the given tag.
+        
+        Keys are filed under tags by ``set``, so only the tagged keys are
+        touched instead of scanning the keyspace. UNLINK frees the values
+        in the background rather than blocking Redis.
+        
+        Args:
+            prefix: Tag to invalidate
+            scan: Also delete untagged keys starting with ``prefix``. Uses
+                incremental SCAN, never KEYS, but still walks the keyspace.
+        """
+        if not self.initialized or not settings.cache_enabled:
             return 0
+            
+        try:
+            tag_key = f"{TAG_KEY_PREFIX}{prefix}"
+            keys = await self.backend.redis.smembers(tag_key)
+            self._l1_discard(key.decode() for key in keys)
+            async with self.backend.redis.pipeline(transaction=False) as pipe:
+                if keys:
+                    pipe.unlink(*keys)
+                pipe.unlink(tag_key)
+                await pipe.execute()
+            count = len(keys)
+            
+            if scan:
+                with self._l1_lock:
+                    stale = [key for key in self._l1 if key.startswith(prefix)]
+                self._l1_discard(stale)
+                count += await self._unlink_matching(f"{prefix}*")
+            
+            if count:
+                logger.info(f"Invalidated {count} cache keys with tag: {prefix}")
+            return count
         except Exception as e:
             logger.error(f"Error invalidating cache by prefix {prefix}: {str(e)}")
             return 0
+    
+    def _l1_discard(self, keys: Iterable[str]) -> None:
+        """Drop keys from the in-process copy."""
+        with self._l1_lock:
+            for key in keys:
+                self._l1.pop(key, None)
+    
+    async def _unlink_matching(self, pattern: str, batch_size: int = SCAN_BATCH_SIZE) -> int:
+        """UNLINK every key matching an anchored pattern, a batch at a time."""
+        count = 0
+        batch = []
+        async for key in self.backend.redis.scan_iter(match=pattern, count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                count += await self.backend.redis.unlink(*batch)
+                batch.clear()
+        if batch:
+            count += await self.backend.redis.unlink(*batch)
+        return count
+    
+    async def list_push(
+        self,
+        key: str,
+        values: Iterable[str],
+        max_length: int,
+        replace: bool = False,
+        expire: Optional[int] = None
+    ) -> bool:
+        """Append values to an existing capped Redis list, or replace it.
+        
+        Args:
+            key: Cache key of the list
+            values: Values to append, oldest first
+            max_length: Number of newest entries kept
+            replace: Build the list from ``values`` instead of appending. Without
+                it, nothing is pushed when the list doesn't exist, so a list is
+                never started from a partial set of values.
+            expire: Time to live in seconds (defaults to CACHE_TTL from settings),
+                renewed on every push
+        """
+        values = list(values)
+        if not values or not self.initialized or not settings.cache_enabled:
+            return False
+            
+        try:
+            expire = expire or settings.cache_ttl
+            async with self.backend.redis.pipeline(transaction=replace) as pipe:
+                if replace:
+                    pipe.unlink(key)
+                    pipe.rpush(key, *values)
+                else:
+                    pipe.rpushx(key, *values)
+                pipe.ltrim(key, -max_length, -1)
+                # No-op when rpushx found no list
+                pipe.expire(key, expire)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error pushing to list {key}: {str(e)}")
+            return False
+    
+    async def list_tail(self, key: str, count: int) -> List[str]:
+        """Get the newest ``count`` values of a list, newest first."""
+        if not self.initialized or not settings.cache_enabled:
+            return []
+            
+        try:
+            values = await self.backend.redis.lrange(key, -count, -1)
+            return [value.decode() for value in reversed(values)]
+        except Exception as e:
+            logger.error(f"Error reading list {key}: {str(e)}")
+            return []
+    
+    async def publish(self, channel: str, message: str) -> bool:
+        """Publish a message to every instance subscribed to a channel."""
+        if not self.initialized or not settings.cache_enabled:
+            return False
+            
+        try:
+            await self.backend.redis.publish(channel, message)
+            return True
+        except Exception as e:
+            logger.error(f"Error publishing to {channel}: {str(e)}")
+            return False
+    
+    async def subscribe(self, channel: str, handler: Callable[[str], None]) -> bool:
+        """Call ``handler`` with every message published to a channel.
+        
+        Used to keep process-local caches coherent across instances: writers
+        publish the key they changed and every instance evicts it.
+        """
+        if not self.initialized or not settings.cache_enabled or channel in self._listeners:
+            return False
+            
+        try:
+            pubsub = self.backend.redis.pubsub()
+            await pubsub.subscribe(channel)
+        except Exception as e:
+            logger.error(f"Error subscribing to {channel}: {str(e)}")
+            return False
+        
+        async def listen():
+            try:
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        handler(message["data"].decode())
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger.error(f"Subscription to {channel} failed: {str(e)}")
+            finally:
+                await pubsub.close()
+        
+        self._listeners[channel] = asyncio.create_task(listen())
+        logger.info(f"Subscribed to cache channel: {channel}")
+        return True
+    
+    async def close(self):
+        """Stop all channel subscriptions."""
+        for task in self._listeners.values():
+            task.cancel()
+        await asyncio.gather(*self._listeners.values(), return_exceptions=True)
+        self._listeners.clear()
 
 # Global cache instance
 cache_manager = CacheManager()
 
+def cached_key(namespace: str, key_prefix: str, **kwargs) -> str:
+    """Get the key ``cached`` stores a call's result under.
+    
+    Use it to delete a single cached result; pass the same keyword
+    arguments the cached function was called with.
+    """
+    return cache_manager.get_cache_key(f"{namespace}:{key_prefix}", **kwargs)
+
 def cached(
     key_prefix: str = "",
     expire: Optional[int] = None,
-    namespace: str = ""
+    namespace: str = "",
+    tag_by: Optional[str] = None
 ):
     """
     Decorator to cache the result of an async function.
@@ -136,8 +416,12 @@ def cached(
         key_prefix: Prefix for the cache key
         expire: Time to live in seconds (defaults to CACHE_TTL from settings)
         namespace: Optional namespace for the cache key
+        tag_by: Optional keyword argument whose value tags the entry as
+            ``{namespace}:{value}``, for invalidate_by_prefix
     """
     def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        name = key_prefix or func.__name__
+        
         @wraps(func)
         async def wrapper(*args, **kwargs) -> T:
             # Skip caching if disabled
@@ -145,8 +429,9 @@ def cached(
                 return await func(*args, **kwargs)
                 
             # Generate cache key
-            cache_key = cache_manager.get_cache_key(
-                f"{namespace}:{key_prefix or func.__name__}",
+            cache_key = cached_key(
+                namespace,
+                name,
                 **{
                     k: v for k, v in kwargs.items() 
                     if k not in ['request', 'response']
@@ -166,10 +451,38 @@ def cached(
                 await cache_manager.set(
                     cache_key, 
                     result,
-                    expire=expire or settings.cache_ttl
+                    expire=expire or settings.cache_ttl,
+                    tags=[f"{namespace}:{kwargs[tag_by]}"] if tag_by in kwargs else None
                 )
                 
             return result
             
         return wrapper
     return decorator
+
+def conditional_response(
+    request: Request,
+    content: bytes,
+    media_type: str = "application/json"
+) -> Response:
+    """
+    Build a response carrying an ETag of its body.
+    
+    When the request's If-None-Match already names that ETag, a bodyless
+    304 Not Modified is returned instead, so polling clients only download
+    payloads that changed. Both are marked ``private, no-cache`` so browsers
+    and shared caches revalidate on every poll rather than serving a stale
+    copy.
+    
+    Args:
+        request: Incoming request, checked for If-None-Match
+        content: Serialized response body
+        media_type: Media type of the body
+    """
+    etag = f'"{xxhash.xxh3_64_hexdigest(content)}"'
+    if_none_match = request.headers.get("if-none-match", "")
+    client_etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in client_etags or "*" in client_etags:
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type=media_type, headers=headers)
@@ -1,48 +1,61 @@
 import os
-from typing import Optional
-from pydantic import BaseSettings, Field
+from functools import lru_cache
+from typing import Annotated, Optional
+from pydantic import Field, field_validator
+from pydantic_settings import BaseSettings, NoDecode, SettingsConfigDict
 
 
 class Settings(BaseSettings):
     """Application settings."""
     
     # Application Settings
-    environment: str = Field("development", env="ENVIRONMENT")
-    log_level: str = Field("INFO", env="LOG_LEVEL")
+    environment: str = Field("development", validation_alias="ENVIRONMENT")
+    log_level: str = Field("INFO", validation_alias="LOG_LEVEL")
     
     # API Settings
-    api_prefix: str = Field("/api", env="API_PREFIX")
-    debug: bool = Field(False, env="DEBUG")
+    api_prefix: str = Field("/api", validation_alias="API_PREFIX")
+    debug: bool = Field(False, validation_alias="DEBUG")
     
     # CORS Settings
-    cors_origins: list[str] = Field(
+    # Comma-separated in the environment, so not JSON-decoded
+    cors_origins: Annotated[list[str], NoDecode] = Field(
         ["http://localhost:5173"],  # Vite dev server by default
-        env="CORS_ORIGINS"
+        validation_alias="CORS_ORIGINS"
     )
     
     # Security
-    secret_key: str = Field("your-secret-key-here", env="SECRET_KEY")
-    access_token_expire_minutes: int = Field(30, env="ACCESS_TOKEN_EXPIRE_MINUTES")
+    secret_key: str = Field("your-secret-key-here", validation_alias="SECRET_KEY")
+    access_token_expire_minutes: int = Field(30, validation_alias="ACCESS_TOKEN_EXPIRE_MINUTES")
     
     # Cache Settings
-    redis_url: str = Field("redis://localhost:6379", env="REDIS_URL")
-    cache_ttl: int = Field(300, env="CACHE_TTL")  # 5 minutes default
-    cache_enabled: bool = Field(True, env="CACHE_ENABLED")
-
-    class Config:
-        env_file = os.getenv("ENV_FILE", ".env")
-        env_file_encoding = "utf-8"
-        case_sensitive = True
-        
-        @classmethod
-        def parse_env_var(cls, field_name: str, raw_val: str):
-            if field_name == "cors_origins":
-                return [origin.strip() for origin in raw_val.split(",") if origin.strip()]
-            return cls.json_loads(raw_val)
+    redis_url: str = Field("redis://localhost:6379", validation_alias="REDIS_URL")
+    cache_ttl: int = Field(300, validation_alias="CACHE_TTL")  # 5 minutes default
+    cache_enabled: bool = Field(True, validation_alias="CACHE_ENABLED")
+    
+    # Firestore Settings
+    # Threads running blocking Firestore calls; they all share the client's
+    # single gRPC channel, which multiplexes their RPCs as HTTP/2 streams
+    firestore_max_workers: int = Field(40, validation_alias="FIRESTORE_MAX_WORKERS")
+
+    model_config = SettingsConfigDict(
+        env_file=os.getenv("ENV_FILE", ".env"),
+        env_file_encoding="utf-8",
+        case_sensitive=True,
+        extra="ignore"
+    )
+
+    @field_validator("cors_origins", mode="before")
+    @classmethod
+    def split_cors_origins(cls, value):
+        """Split the comma-separated origins list read from the environment."""
+        if isinstance(value, str):
+            return [origin.strip() for origin in value.split(",") if origin.strip()]
+        return value
 
 
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
-    """Get the application settings."""
+    """Get the application settings, parsed from the environment once."""
     return Settings()
 
 
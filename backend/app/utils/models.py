@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import Dict, List, Optional, Any, Union
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from enum import Enum
 
 
@@ -36,25 +36,41 @@ class MessageInDB(MessageBase):
     user_id: str
     timestamp: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
-class MessageResponse(MessageInDB):
-    """Message model for API responses."""
-    quoted_message: Optional['MessageResponse'] = None
+class MessageResponseFlat(MessageInDB):
+    """Message model for list responses, which never inline quoted messages."""
 
-    @validator('timestamp', pre=True)
+    @field_validator('timestamp', mode='before')
+    @classmethod
     def parse_timestamp(cls, value):
         if isinstance(value, str):
             return datetime.fromisoformat(value)
         return value
 
 
+class MessageResponse(MessageResponseFlat):
+    """Message model for API responses."""
+    quoted_message: Optional['MessageResponse'] = None
+
+
+class ChatTurn(BaseModel):
+    """A single prior turn of the conversation sent with a chat request."""
+    role: MessageRole
+    content: str = Field(..., min_length=1)
+
+
+class ChatRequest(BaseModel):
+    """Model for sending a message to Nova."""
+    message: str = Field(..., min_length=1, max_length=4000)
+    conversation_history: List[ChatTurn] = Field(default_factory=list)
+
+
 class SummaryBase(BaseModel):
     """Base summary model."""
     summary_text: str
-    message_ids: List[str] = Field(..., min_items=1)
+    message_ids: List[str] = Field(..., min_length=1)
     metadata: Dict[str, Any] = Field(default_factory=dict)
 
 
@@ -69,20 +85,21 @@ class SummaryInDB(SummaryBase):
     user_id: str
     timestamp: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class SummaryResponse(SummaryInDB):
     """Summary model for API responses."""
-    messages: Optional[List[MessageResponse]] = None
+    # Summarized messages are projections and never carry a quote
+    messages: Optional[List[MessageResponseFlat]] = None
 
-    @validator('timestamp', pre=True)
+    @field_validator('timestamp', mode='before')
+    @classmethod
     def parse_timestamp(cls, value):
         if isinstance(value, str):
             return datetime.fromisoformat(value)
         return value
 
 
-# Update forward refs for recursive models
-MessageResponse.update_forward_refs()
\ No newline at end of file
+# Resolve forward refs for recursive models
+MessageResponse.model_rebuild()
\ No newline at end of file
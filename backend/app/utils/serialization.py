@@ -0,0 +1,17 @@
+"""
+JSON serialization helpers shared by the cache and the API routes.
+"""
+from datetime import datetime
+from typing import Any
+
+
+def json_default(value: Any) -> Any:
+    """Serialize values orjson and msgspec reject.
+    
+    Both only accept exact ``datetime`` instances, so subclasses such as
+    Firestore's DatetimeWithNanoseconds are written as ISO 8601 strings.
+    Used as orjson's ``default`` and msgspec's ``enc_hook``.
+    """
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,21 @@
+"""
+Test setup.
+
+Registers a Firebase app with anonymous credentials before any app module
+is imported, so Firestore clients and queries can be built without a
+service account or network access.
+"""
+import firebase_admin
+from firebase_admin import credentials
+from google.auth.credentials import AnonymousCredentials
+
+
+class AnonymousCredential(credentials.Base):
+    """Firebase credential that never authenticates."""
+    
+    def get_credential(self):
+        return AnonymousCredentials()
+
+
+if not firebase_admin._apps:
+    firebase_admin.initialize_app(AnonymousCredential(), {"projectId": "nova-test"})
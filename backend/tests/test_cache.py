@@ -0,0 +1,110 @@
+"""Tests for the cache helpers: conditional responses, cache keys and the LRU."""
+import asyncio
+
+from starlette.requests import Request
+
+from app.utils import cache
+from app.utils.cache import LRUCache, cache_manager, cached, cached_key, conditional_response
+
+
+def make_request(if_none_match=None):
+    """Build a bare GET request, optionally carrying If-None-Match."""
+    headers = []
+    if if_none_match is not None:
+        headers.append((b"if-none-match", if_none_match.encode()))
+    return Request({"type": "http", "method": "GET", "headers": headers})
+
+
+def test_conditional_response_sends_body_with_etag():
+    response = conditional_response(make_request(), b'[{"id": "t1"}]')
+    
+    assert response.status_code == 200
+    assert response.body == b'[{"id": "t1"}]'
+    assert response.headers["etag"].startswith('"')
+    assert response.headers["cache-control"] == "private, no-cache"
+
+
+def test_conditional_response_answers_matching_etag_with_304():
+    etag = conditional_response(make_request(), b"[]").headers["etag"]
+    
+    response = conditional_response(make_request(f'"other", W/{etag}'), b"[]")
+    
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == etag
+    assert response.headers["cache-control"] == "private, no-cache"
+
+
+def test_conditional_response_sends_changed_body():
+    etag = conditional_response(make_request(), b"[]").headers["etag"]
+    
+    response = conditional_response(make_request(etag), b'[{"id": "t1"}]')
+    
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_cache_key_ignores_argument_order():
+    assert (
+        cache_manager.get_cache_key("topics", user_id="u1", limit=5)
+        == cache_manager.get_cache_key("topics", limit=5, user_id="u1")
+    )
+
+
+def test_cache_key_depends_on_values_and_prefix():
+    key = cache_manager.get_cache_key("topics", user_id="u1")
+    
+    assert key.startswith("topics:")
+    assert key != cache_manager.get_cache_key("topics", user_id="u2")
+    assert key != cache_manager.get_cache_key("summaries", user_id="u1")
+    assert cache_manager.get_cache_key("topics") == "topics"
+
+
+def test_cache_key_accepts_unhashable_values():
+    key = cache_manager.get_cache_key("topics", ids=["a", "b"])
+    
+    assert key == cache_manager.get_cache_key("topics", ids=["a", "b"])
+    assert key != cache_manager.get_cache_key("topics", ids=["a"])
+
+
+def test_cached_key_matches_the_key_cached_stores_under(monkeypatch):
+    looked_up = []
+    stored = []
+    
+    async def fake_get(key):
+        looked_up.append(key)
+        return None
+    
+    async def fake_set(key, value, expire=None, tags=None):
+        stored.append(key)
+        return True
+    
+    monkeypatch.setattr(cache.settings, "cache_enabled", True)
+    monkeypatch.setattr(cache_manager, "get", fake_get)
+    monkeypatch.setattr(cache_manager, "set", fake_set)
+    
+    @cached(key_prefix="topic", namespace="topics")
+    async def get_topic(topic_id):
+        return {"id": topic_id}
+    
+    asyncio.run(get_topic(topic_id="t1"))
+    
+    expected = cached_key("topics", "topic", topic_id="t1")
+    assert looked_up == [expected]
+    assert stored == [expected]
+    assert expected != cache_manager.get_cache_key("topic", topic_id="t1")
+
+
+def test_lru_cache_evicts_least_recently_used():
+    lru = LRUCache(maxsize=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    
+    # Reading "a" makes "b" the least recently used
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+    
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+    assert len(lru) == 2
@@ -0,0 +1,135 @@
+"""Tests for FirebaseService queries, pagination cursors and MessageLoader."""
+import asyncio
+from datetime import datetime, timezone
+
+from google.cloud.firestore_v1.query import Query
+import pytest
+
+from app.firebase.constants import MESSAGES_COLLECTION
+from app.services.firebase_service import (
+    FirebaseService,
+    MessageLoader,
+    decode_message_cursor,
+    encode_message_cursor,
+)
+
+
+def build_messages_query(monkeypatch, cursor=None, topic_id=None):
+    """Run get_messages and render its query as the request sent to Firestore."""
+    queries = []
+    monkeypatch.setattr(Query, "stream", lambda self, *args, **kwargs: queries.append(self) or iter([]))
+    
+    asyncio.run(FirebaseService.get_messages("user-1", 50, cursor=cursor, topic_id=topic_id))
+    
+    assert len(queries) == 1
+    return queries[0]._to_protobuf()
+
+
+def test_messages_query_orders_by_timestamp_then_document_id(monkeypatch):
+    structured_query = build_messages_query(monkeypatch)
+    
+    assert [order.field.field_path for order in structured_query.order_by] == [
+        "timestamp",
+        "__name__",
+    ]
+
+
+def test_messages_query_starts_after_cursor(monkeypatch):
+    cursor = encode_message_cursor({
+        "timestamp": datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+        "id": "msg-1",
+    })
+    
+    structured_query = build_messages_query(monkeypatch, cursor=cursor)
+    
+    start_at = structured_query.start_at
+    assert not start_at.before
+    assert len(start_at.values) == 2
+    assert start_at.values[1].reference_value.endswith(f"/{MESSAGES_COLLECTION}/msg-1")
+
+
+def test_messages_query_filters_by_topic(monkeypatch):
+    structured_query = build_messages_query(monkeypatch, topic_id="topic-1")
+    
+    filters = structured_query.where.composite_filter.filters
+    assert [f.field_filter.field.field_path for f in filters] == ["user_id", "topic_id"]
+
+
+def test_cursor_round_trips():
+    timestamp = datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc)
+    
+    cursor = encode_message_cursor({"timestamp": timestamp, "id": "msg-1", "content": "hi"})
+    
+    assert decode_message_cursor(cursor) == {"timestamp": timestamp, "id": "msg-1"}
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", "e30=", "eyJ0IjogMX0="])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_message_cursor(cursor)
+
+
+def fake_messages_by_ids(calls, release=None):
+    """Stand-in for get_messages_by_ids that records each batch it is asked for."""
+    async def get_messages_by_ids(message_ids, fields=None):
+        calls.append(list(message_ids))
+        if release is not None:
+            await release.wait()
+        return {message_id: {"id": message_id} for message_id in message_ids if message_id != "missing"}
+    return get_messages_by_ids
+
+
+def test_message_loader_batches_loads_in_the_same_tick(monkeypatch):
+    calls = []
+    monkeypatch.setattr(FirebaseService, "get_messages_by_ids", fake_messages_by_ids(calls))
+    
+    async def load():
+        loader = MessageLoader()
+        return await asyncio.gather(
+            loader.load("a"),
+            loader.load("b"),
+            loader.load("a"),
+            loader.load("missing"),
+        )
+    
+    first_a, b, second_a, missing = asyncio.run(load())
+    
+    assert calls == [["a", "b", "missing"]]
+    assert first_a == second_a == {"id": "a"}
+    assert first_a is not second_a
+    assert b == {"id": "b"}
+    assert missing is None
+
+
+def test_message_loader_survives_a_cancelled_load(monkeypatch):
+    calls = []
+    
+    async def load():
+        release = asyncio.Event()
+        monkeypatch.setattr(
+            FirebaseService,
+            "get_messages_by_ids",
+            fake_messages_by_ids(calls, release)
+        )
+        loader = MessageLoader()
+        cancelled = asyncio.create_task(loader.load("a"))
+        waiting = asyncio.create_task(loader.load("a"))
+        other = asyncio.create_task(loader.load("b"))
+        # Let the loads queue up and the batch read start
+        for _ in range(3):
+            await asyncio.sleep(0)
+        
+        cancelled.cancel()
+        release.set()
+        
+        results = await asyncio.gather(waiting, other)
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        # A later load of the same ID is served by the settled batch
+        return results, await loader.load("a")
+    
+    (waiting, other), later = asyncio.run(load())
+    
+    assert calls == [["a", "b"]]
+    assert waiting == later == {"id": "a"}
+    assert other == {"id": "b"}
@@ -0,0 +1,48 @@
+"""Tests for GroqClient's retry delays."""
+import httpx
+import pytest
+
+from app.llm.groq_client import (
+    RETRY_BASE_DELAY,
+    RETRY_JITTER,
+    RETRY_MAX_DELAY,
+    GroqClient,
+)
+
+
+def status_error(status_code, headers=None):
+    """Build the error raise_for_status raises for a response."""
+    request = httpx.Request("POST", "https://api.groq.test/chat/completions")
+    response = httpx.Response(status_code, headers=headers, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+@pytest.mark.parametrize("retry_after, expected", [
+    ("2", 2.0),
+    ("0.5", 0.5),
+    ("-3", 0.0),
+    ("3600", RETRY_MAX_DELAY),
+])
+def test_retry_after_is_honoured_within_bounds(retry_after, expected):
+    error = status_error(429, {"retry-after": retry_after})
+    
+    assert GroqClient._get_retry_delay(error, attempt=0) == expected
+
+
+@pytest.mark.parametrize("error", [
+    status_error(503),
+    status_error(429, {"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}),
+    httpx.ConnectError("connection refused"),
+])
+def test_backoff_doubles_per_attempt_with_jitter(error):
+    for attempt in range(3):
+        delay = GroqClient._get_retry_delay(error, attempt)
+        base = RETRY_BASE_DELAY * 2 ** attempt
+        
+        assert base <= delay <= base + RETRY_JITTER
+
+
+def test_backoff_is_capped():
+    delay = GroqClient._get_retry_delay(status_error(500), attempt=20)
+    
+    assert RETRY_MAX_DELAY <= delay <= RETRY_MAX_DELAY + RETRY_JITTER
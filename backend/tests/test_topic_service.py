@@ -0,0 +1,112 @@
+"""Tests for topic assignment, reclustering and topic cache invalidation.
+
+Redis is never initialized here, so cache reads miss and writes are skipped.
+"""
+import asyncio
+
+import pytest
+
+from app.services import topic_service as topic_module
+from app.services.topic_service import TopicService
+from app.utils import cache
+from app.utils.cache import cache_manager
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """A fresh TopicService whose Firestore calls are stubbed out."""
+    async def get_messages(user_id, limit=50, **kwargs):
+        return []
+    
+    async def set_message_topic(message_id, topic_id):
+        return True
+    
+    monkeypatch.setattr(topic_module.FirebaseService, "get_messages", get_messages)
+    monkeypatch.setattr(topic_module.FirebaseService, "set_message_topic", set_message_topic)
+    return TopicService()
+
+
+def analyze(service, message_id, content, user_id="u1"):
+    """Assign a message to a topic and return the topic ID."""
+    return asyncio.run(service.analyze_message_topic(
+        message_id=message_id,
+        content=content,
+        user_id=user_id
+    ))
+
+
+def test_similar_messages_share_a_topic(service):
+    hiking = analyze(service, "m1", "planning a hiking trip to the mountains")
+    more_hiking = analyze(service, "m2", "best mountains for a hiking trip")
+    baking = analyze(service, "m3", "chocolate cake recipe with buttercream frosting")
+    
+    assert hiking is not None
+    assert more_hiking == hiking
+    assert baking not in (None, hiking)
+    assert service.topics[hiking]["message_count"] == 2
+    assert service._by_user["u1"] == [hiking, baking]
+
+
+def test_topic_ids_are_unique_across_processes():
+    # Each TopicService stands in for a separate worker or a restart
+    first = TopicService()._next_topic_id("u1")
+    second = TopicService()._next_topic_id("u1")
+    
+    assert first.startswith("topic_u1_")
+    assert first != second
+
+
+def test_invalidation_deletes_the_keys_topics_are_cached_under(service, monkeypatch):
+    looked_up = []
+    deleted = []
+    
+    async def fake_get(key):
+        looked_up.append(key)
+        return None
+    
+    async def fake_delete_many(*keys):
+        deleted.extend(keys)
+        return len(keys)
+    
+    async def fake_invalidate_by_prefix(prefix, scan=False):
+        return 0
+    
+    monkeypatch.setattr(cache.settings, "cache_enabled", True)
+    monkeypatch.setattr(cache_manager, "get", fake_get)
+    monkeypatch.setattr(cache_manager, "delete_many", fake_delete_many)
+    monkeypatch.setattr(cache_manager, "invalidate_by_prefix", fake_invalidate_by_prefix)
+    
+    async def run():
+        await service.get_topic(topic_id="t1")
+        await service.get_user_topics(user_id="u1")
+        await service._invalidate_topic_caches("u1", "t1")
+    
+    asyncio.run(run())
+    
+    assert sorted(deleted) == sorted(looked_up)
+
+
+def test_recluster_merges_into_existing_centroids(service, monkeypatch):
+    vector = service.vectorizer.transform(["unrelated gardening tips"])
+    service._topic_sums["u1"] = {"topic_out": vector, "topic_a": vector, "topic_b": vector}
+    service._rebuild_centroids("u1")
+    
+    window = [
+        {"id": f"m{i}", "role": "user", "content": "hiking trip to the mountains", "topic_id": topic_id}
+        for i, topic_id in enumerate(["topic_a"] * 4 + ["topic_b"] * 2)
+    ]
+    
+    async def get_messages(user_id, limit=50, **kwargs):
+        # An assignment that lands while recluster is awaiting
+        service._add_to_centroid("u1", "topic_new", vector)
+        return window
+    
+    monkeypatch.setattr(topic_module.FirebaseService, "get_messages", get_messages)
+    
+    asyncio.run(service.recluster("u1"))
+    
+    topic_ids, centroids = service._centroids["u1"]
+    assert sorted(topic_ids) == ["topic_a", "topic_new", "topic_out"]
+    assert centroids.shape[0] == 3
+    # topic_a's centroid was rebuilt from the clustered messages
+    assert (service._topic_sums["u1"]["topic_a"] != vector).nnz > 0